@@ -1,17 +1,44 @@
+from contextlib import asynccontextmanager
 from http import HTTPStatus
 
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 
-from fast_zero.routers import auth, todos, users
+from fast_zero.database import engine, pool_stats
+from fast_zero.events import broker
+from fast_zero.metrics import render_metrics
+from fast_zero.middleware import MetricsMiddleware, ProfilingMiddleware
+from fast_zero.routers import auth, profiles, todos, users
 from fast_zero.schemas import Message
+from fast_zero.settings import Settings
 
-app = FastAPI()
+settings = Settings()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await broker.close()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(users.router)
 app.include_router(auth.router)
 app.include_router(todos.router)
 
+# Left out of the stack entirely unless enabled, so it costs nothing.
+if settings.PROFILING_ENABLED:  # pragma: no cover
+    app.add_middleware(ProfilingMiddleware, settings=settings)
+    app.include_router(profiles.router)
+
 
 @app.get('/', status_code=HTTPStatus.OK, response_model=Message)
 def read_root():
     return {'message': '42'}
+
+
+@app.get('/metrics', response_class=PlainTextResponse, include_in_schema=False)
+def read_metrics():
+    return render_metrics(pool_stats(engine))
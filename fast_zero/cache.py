@@ -0,0 +1,53 @@
+import time
+from collections import OrderedDict
+
+from fast_zero.metrics import Counter
+
+
+class TTLCache:
+    def __init__(self, *, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = Counter()
+        self.misses = Counter()
+        self._entries = OrderedDict()
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0 and self.ttl > 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+
+        if entry is None:
+            self.misses.inc()
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.misses.inc()
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits.inc()
+        return value
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,99 @@
+import hashlib
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from email.utils import format_datetime, parsedate_to_datetime
+from http import HTTPStatus
+from typing import Annotated
+
+from fastapi import Header, HTTPException, Response
+
+
+def version_etag(version: int):
+    return f'"{version}"'
+
+
+def parse_version_etag(value: str):
+    try:
+        return int(value.strip().removeprefix('W/').strip('"'))
+    except ValueError:
+        raise HTTPException(
+            status_code=HTTPStatus.PRECONDITION_FAILED,
+            detail='Precondition failed',
+        )
+
+
+@dataclass
+class VersionPrecondition:
+    expected: int | None
+    response: Response
+
+    def set_etag(self, version: int):
+        self.response.headers['ETag'] = version_etag(version)
+
+
+def version_precondition(
+    response: Response,
+    if_match: Annotated[str | None, Header()] = None,
+):
+    expected = None
+    if if_match and if_match.strip() != '*':
+        expected = parse_version_etag(if_match)
+
+    return VersionPrecondition(expected=expected, response=response)
+
+
+def weak_etag(*parts):
+    digest = hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+    return f'W/"{digest}"'
+
+
+def _opaque_tag(tag: str):
+    return tag.strip().removeprefix('W/')
+
+
+@dataclass
+class ConditionalGet:
+    if_none_match: str | None
+    if_modified_since: str | None
+    response: Response
+
+    def not_modified(self, etag: str, last_modified: datetime | None = None):
+        headers = {'ETag': etag}
+        if last_modified:
+            last_modified = last_modified.replace(tzinfo=UTC, microsecond=0)
+            headers['Last-Modified'] = format_datetime(
+                last_modified, usegmt=True
+            )
+        self.response.headers.update(headers)
+
+        if self._is_fresh(etag, last_modified):
+            return Response(
+                status_code=HTTPStatus.NOT_MODIFIED, headers=headers
+            )
+        return None
+
+    def _is_fresh(self, etag: str, last_modified: datetime | None):
+        if self.if_none_match:
+            tags = {_opaque_tag(tag) for tag in self.if_none_match.split(',')}
+            return '*' in tags or _opaque_tag(etag) in tags
+
+        if self.if_modified_since and last_modified:
+            try:
+                since = parsedate_to_datetime(self.if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            return since.tzinfo is not None and last_modified <= since
+
+        return False
+
+
+def conditional_get(
+    response: Response,
+    if_none_match: Annotated[str | None, Header()] = None,
+    if_modified_since: Annotated[str | None, Header()] = None,
+):
+    return ConditionalGet(
+        if_none_match=if_none_match,
+        if_modified_since=if_modified_since,
+        response=response,
+    )
@@ -0,0 +1,113 @@
+from collections import Counter
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fast_zero.models import Todo, TodoChange, TodoCounter, TodoState
+
+
+def _upsert(session: AsyncSession, model):
+    if session.bind.dialect.name == 'postgresql':
+        return postgresql_insert(model)
+    return sqlite_insert(model)
+
+
+async def next_change(session: AsyncSession, user_id: int):
+    # Call this before any other write of the transaction: the row lock is
+    # held until commit, so a user's changes commit in seq order and a
+    # sync token can never pass a change that is still in flight.
+    statement = _upsert(session, TodoChange).values(user_id=user_id, seq=1)
+    return await session.scalar(
+        statement.on_conflict_do_update(
+            index_elements=[TodoChange.user_id],
+            set_={'seq': TodoChange.seq + 1},
+        ).returning(TodoChange.seq)
+    )
+
+
+def change_seq(user_id: int):
+    return func.coalesce(
+        select(TodoChange.seq)
+        .where(TodoChange.user_id == user_id)
+        .scalar_subquery(),
+        0,
+    )
+
+
+async def read_change(session: AsyncSession, user_id: int):
+    return await session.scalar(select(change_seq(user_id)))
+
+
+def state_deltas(added=(), removed=()):
+    deltas = Counter(added)
+    deltas.subtract(removed)
+    return deltas
+
+
+async def adjust_counters(
+    session: AsyncSession, user_id: int, deltas: Counter
+):
+    # Rows are written in state order so concurrent writers of the same
+    # user lock them in the same sequence.
+    rows = [
+        {'user_id': user_id, 'state': state, 'count': deltas[state]}
+        for state in TodoState
+        if deltas[state]
+    ]
+    if not rows:
+        return
+
+    statement = _upsert(session, TodoCounter).values(rows)
+    await session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[TodoCounter.user_id, TodoCounter.state],
+            set_={'count': TodoCounter.count + statement.excluded.count},
+        )
+    )
+
+
+async def read_counters(session: AsyncSession, user_id: int):
+    counters = await session.execute(
+        select(TodoCounter.state, TodoCounter.count).where(
+            TodoCounter.user_id == user_id
+        )
+    )
+    return {state: 0 for state in TodoState} | dict(counters.all())
+
+
+async def count_todos(session: AsyncSession, user_id: int):
+    counts = await session.execute(
+        select(Todo.state, func.count())
+        .where(Todo.user_id == user_id)
+        .group_by(Todo.state)
+    )
+    return {state: 0 for state in TodoState} | dict(counts.all())
+
+
+async def counter_drift(session: AsyncSession, user_id: int):
+    stored = await read_counters(session, user_id)
+    actual = await count_todos(session, user_id)
+
+    return {
+        state: (stored[state], actual[state])
+        for state in TodoState
+        if stored[state] != actual[state]
+    }
+
+
+async def rebuild_counters(session: AsyncSession, user_id: int | None = None):
+    stored = delete(TodoCounter)
+    actual = select(Todo.user_id, Todo.state, func.count()).group_by(
+        Todo.user_id, Todo.state
+    )
+    if user_id is not None:
+        stored = stored.where(TodoCounter.user_id == user_id)
+        actual = actual.where(Todo.user_id == user_id)
+
+    await session.execute(stored)
+    await session.execute(
+        insert(TodoCounter).from_select(['user_id', 'state', 'count'], actual)
+    )
+    await session.commit()
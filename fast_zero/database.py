@@ -1,10 +1,166 @@
+import time
+from contextvars import ContextVar
+
+from fastapi import Request
+from sqlalchemy import event, exc, make_url
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 
+from fast_zero.metrics import QueryStats, database_pool_metrics
+from fast_zero.querylog import QueryLog
 from fast_zero.settings import Settings
 
-engine = create_async_engine(Settings().DATABASE_URL)
+query_stats: ContextVar[QueryStats | None] = ContextVar(
+    'query_stats', default=None
+)
+query_log: ContextVar[QueryLog | None] = ContextVar('query_log', default=None)
+
+
+class MeteredQueuePool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            database_pool_metrics.checkout_timeouts.inc()
+            raise
+        finally:
+            database_pool_metrics.checkout_wait.observe(
+                time.perf_counter() - started
+            )
+
+
+@event.listens_for(Engine, 'connect')
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    if 'sqlite' not in type(dbapi_connection).__module__:
+        return
+
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.close()
+
+
+def _start_query_timer(conn, *args):
+    if query_stats.get() is not None or query_log.get() is not None:
+        conn.info['query_started'] = time.perf_counter()
+
+
+def _stop_query_timer(conn, cursor, statement, parameters, *args):
+    stats, log = query_stats.get(), query_log.get()
+    if stats is None and log is None:
+        return
+
+    elapsed = time.perf_counter() - conn.info.pop(
+        'query_started', time.perf_counter()
+    )
+    if stats is not None:
+        stats.statements += 1
+        stats.seconds += elapsed
+    if log is not None:
+        log.record(statement, parameters, elapsed, *args[1:])
+
+
+def instrument_engine(engine):
+    # Statements are attributed to whatever QueryStats and QueryLog the
+    # caller's context holds: the metrics middleware sets the former per
+    # request and get_session the latter per session.
+    event.listen(
+        engine.sync_engine, 'before_cursor_execute', _start_query_timer
+    )
+    event.listen(engine.sync_engine, 'after_cursor_execute', _stop_query_timer)
+
+
+def engine_options(settings: Settings):
+    url = make_url(settings.DATABASE_URL)
+    backend = url.get_backend_name()
+    options = {'pool_pre_ping': settings.DATABASE_POOL_PRE_PING}
+    connect_args = {}
+
+    if backend == 'sqlite' and url.database in {None, '', ':memory:'}:
+        return options
+
+    if settings.DATABASE_PGBOUNCER:
+        options['poolclass'] = NullPool
+        connect_args['prepare_threshold'] = None
+    else:
+        options.update(
+            poolclass=MeteredQueuePool,
+            pool_size=settings.DATABASE_POOL_SIZE,
+            max_overflow=settings.DATABASE_MAX_OVERFLOW,
+            pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+            pool_recycle=settings.DATABASE_POOL_RECYCLE,
+        )
+
+    # PgBouncer rejects unknown startup parameters, so behind it the
+    # timeout is set per transaction by apply_statement_timeout instead.
+    if (
+        backend == 'postgresql'
+        and settings.DATABASE_STATEMENT_TIMEOUT
+        and not settings.DATABASE_PGBOUNCER
+    ):
+        connect_args['options'] = (
+            f'-c statement_timeout={settings.DATABASE_STATEMENT_TIMEOUT}'
+        )
+
+    if connect_args:
+        options['connect_args'] = connect_args
+
+    return options
+
+
+def apply_statement_timeout(engine, settings: Settings):
+    if not (
+        settings.DATABASE_PGBOUNCER
+        and settings.DATABASE_STATEMENT_TIMEOUT
+        and engine.dialect.name == 'postgresql'
+    ):
+        return
+
+    timeout = int(settings.DATABASE_STATEMENT_TIMEOUT)
+
+    def set_local_statement_timeout(conn):
+        conn.exec_driver_sql(f'SET LOCAL statement_timeout = {timeout}')
+
+    event.listen(engine.sync_engine, 'begin', set_local_statement_timeout)
+
+
+def pool_stats(engine):
+    pool = engine.pool
+    if not isinstance(pool, AsyncAdaptedQueuePool):
+        return {}
+
+    capacity = pool.size() + pool._max_overflow
+    return {
+        'size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'overflow': max(pool.overflow(), 0),
+        'capacity': capacity,
+        'utilization': pool.checkedout() / capacity if capacity else 0.0,
+    }
+
+
+settings = Settings()
+
+engine = create_async_engine(settings.DATABASE_URL, **engine_options(settings))
+instrument_engine(engine)
+apply_statement_timeout(engine, settings)
+
+
+def create_query_log(settings: Settings):
+    return QueryLog(
+        slow_threshold=settings.QUERY_SLOW_THRESHOLD,
+        max_statements=settings.QUERY_MAX_STATEMENTS,
+        max_repeats=settings.QUERY_MAX_REPEATS,
+    )
 
 
-async def get_session():  # pragma: no cover
-    async with AsyncSession(engine, expire_on_commit=False) as session:
-        yield session
+async def get_session(request: Request):  # pragma: no cover
+    log = create_query_log(settings)
+    token = query_log.set(log)
+    try:
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            yield session
+    finally:
+        query_log.reset(token)
+        log.report(f'{request.method} {request.url.path}')
@@ -0,0 +1,266 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from contextlib import aclosing
+
+import psycopg
+from sqlalchemy import Text, func, literal, make_url, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.event import listens_for
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from fast_zero.metrics import event_metrics
+from fast_zero.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = 'todo_events'
+NOTIFY_PAYLOAD_LIMIT = 8000
+RECONNECT_DELAY = 0.5
+RECONNECT_MAX_DELAY = 30.0
+PENDING_EVENTS = 'pending_events'
+
+
+@listens_for(Session, 'after_commit')
+def _deliver_pending_events(session):
+    for dispatch, message in session.info.pop(PENDING_EVENTS, []):
+        dispatch(message)
+
+
+@listens_for(Session, 'after_soft_rollback')
+def _discard_pending_events(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop(PENDING_EVENTS, None)
+
+
+class MemoryBackend:
+    def __init__(self):
+        self._dispatch = None
+
+    async def start(self, dispatch, disconnected):
+        self._dispatch = dispatch
+
+    async def publish(self, session: AsyncSession, messages: list[dict]):
+        # Held on the session until its transaction commits, the way
+        # PostgreSQL holds a NOTIFY; nobody has subscribed before start.
+        if self._dispatch is not None:
+            if not session.in_transaction():
+                await session.begin()
+            session.info.setdefault(PENDING_EVENTS, []).extend(
+                (self._dispatch, message) for message in messages
+            )
+
+    async def close(self):
+        pass
+
+
+def _notify_payload(message: dict):
+    payload = json.dumps(message, separators=(',', ':'))
+    if len(payload.encode()) >= NOTIFY_PAYLOAD_LIMIT:
+        # NOTIFY rejects large payloads; send the identity only and let
+        # the client fetch the rest through /todos/sync.
+        data = {key: message['data'][key] for key in ('id', 'version')}
+        payload = json.dumps(message | {'data': data})
+
+    return payload
+
+
+class PostgresBackend:
+    def __init__(self, database_url: str):
+        url = make_url(database_url).set(drivername='postgresql')
+        self.conninfo = url.render_as_string(hide_password=False)
+        self._listener = None
+
+    async def start(self, dispatch, disconnected):
+        connection = await self._listen()
+        self._listener = asyncio.create_task(
+            self._forward_notifications(connection, dispatch, disconnected)
+        )
+
+    @staticmethod
+    async def publish(session: AsyncSession, messages: list[dict]):
+        payloads = [_notify_payload(message) for message in messages]
+        payload = func.unnest(literal(payloads, ARRAY(Text))).column_valued(
+            'payload'
+        )
+        # Sent inside the write's transaction: PostgreSQL delivers them on
+        # commit, in order, and drops them on rollback.
+        await session.execute(select(func.pg_notify(NOTIFY_CHANNEL, payload)))
+
+    async def close(self):
+        if self._listener:
+            self._listener.cancel()
+
+    async def _listen(self):
+        connection = await psycopg.AsyncConnection.connect(
+            self.conninfo, autocommit=True
+        )
+        try:
+            await connection.execute(f'LISTEN {NOTIFY_CHANNEL}')
+        except BaseException:
+            await connection.close()
+            raise
+
+        return connection
+
+    async def _forward_notifications(self, connection, dispatch, disconnected):
+        delay = RECONNECT_DELAY
+        while True:
+            try:
+                async with connection:
+                    async for notify in connection.notifies():
+                        delay = RECONNECT_DELAY
+                        try:
+                            dispatch(json.loads(notify.payload))
+                        except Exception:
+                            logger.exception(
+                                'Dropped a %s notification', NOTIFY_CHANNEL
+                            )
+            except psycopg.Error:
+                logger.exception('Lost the %s listener', NOTIFY_CHANNEL)
+
+            # Whatever was notified while disconnected is gone; ending the
+            # streams makes clients catch up through /todos/sync.
+            disconnected()
+            connection = None
+            while connection is None:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+                try:
+                    connection = await self._listen()
+                except psycopg.Error:
+                    logger.warning(
+                        'Reconnecting the %s listener failed', NOTIFY_CHANNEL
+                    )
+
+
+class Subscription:
+    def __init__(self, user_id: int, buffer_size: int):
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize=buffer_size)
+
+    def push(self, frame: str):
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            # Slow consumer: drop what it has not read and end its stream.
+            self.close()
+            return False
+
+        return True
+
+    def close(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class Broker:
+    def __init__(self, backend, buffer_size: int):
+        self.backend = backend
+        self.buffer_size = buffer_size
+        self._subscriptions = defaultdict(set)
+        self._started = False
+        self._starting = asyncio.Lock()
+
+    def __len__(self):
+        return sum(len(group) for group in self._subscriptions.values())
+
+    async def start(self):
+        async with self._starting:
+            if not self._started:
+                await self.backend.start(self._dispatch, self._disconnected)
+                self._started = True
+
+    async def close(self):
+        if self._started:
+            self._started = False
+            await self.backend.close()
+
+    async def subscribe(self, user_id: int):
+        await self.start()
+        subscription = Subscription(user_id, self.buffer_size)
+        self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        group = self._subscriptions.get(subscription.user_id)
+        if group is not None:
+            group.discard(subscription)
+            if not group:
+                del self._subscriptions[subscription.user_id]
+
+    async def publish(
+        self, session: AsyncSession, user_id: int, events: list[tuple]
+    ):
+        if not events:
+            return
+
+        await self.backend.publish(
+            session,
+            [
+                {'user_id': user_id, 'event': event, 'data': data}
+                for event, data in events
+            ],
+        )
+        event_metrics.published.inc(len(events))
+
+    async def listen(self, user_id: int, keepalive: float):
+        # Subscribing inside the generator ties the subscription to the
+        # response body, so a client gone before it starts leaks nothing.
+        subscription = await self.subscribe(user_id)
+        async with aclosing(self.stream(subscription, keepalive)) as frames:
+            async for frame in frames:
+                yield frame
+
+    async def stream(self, subscription: Subscription, keepalive: float):
+        try:
+            while True:
+                try:
+                    frame = await asyncio.wait_for(
+                        subscription.queue.get(), keepalive
+                    )
+                except TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+
+                if frame is None:
+                    break
+                yield frame
+        finally:
+            self.unsubscribe(subscription)
+
+    def _disconnected(self):
+        subscriptions, self._subscriptions = (
+            self._subscriptions,
+            defaultdict(set),
+        )
+        for group in subscriptions.values():
+            for subscription in group:
+                subscription.close()
+
+    def _dispatch(self, message: dict):
+        group = self._subscriptions.get(message['user_id'])
+        if not group:
+            return
+
+        data = json.dumps(message['data'], separators=(',', ':'))
+        frame = f'event: {message["event"]}\ndata: {data}\n\n'
+        for subscription in list(group):
+            if not subscription.push(frame):
+                self.unsubscribe(subscription)
+                event_metrics.slow_consumers.inc()
+
+
+def create_broker(settings: Settings):
+    if settings.EVENTS_BACKEND == 'postgres':
+        backend = PostgresBackend(settings.DATABASE_URL)
+    else:
+        backend = MemoryBackend()
+
+    return Broker(backend, settings.EVENTS_BUFFER_SIZE)
+
+
+broker = create_broker(Settings())
@@ -0,0 +1,316 @@
+from bisect import bisect_left
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+
+@dataclass
+class Counter:
+    value: int = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+
+@dataclass
+class Summary:
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+
+@dataclass
+class PasswordHashMetrics:
+    queue_wait: Summary
+    hash_time: Summary
+    rejected: Counter
+    in_flight: Counter
+
+
+password_hash_metrics = PasswordHashMetrics(
+    queue_wait=Summary(),
+    hash_time=Summary(),
+    rejected=Counter(),
+    in_flight=Counter(),
+)
+
+
+@dataclass
+class DatabasePoolMetrics:
+    checkout_wait: Summary
+    checkout_timeouts: Counter
+
+
+database_pool_metrics = DatabasePoolMetrics(
+    checkout_wait=Summary(), checkout_timeouts=Counter()
+)
+
+
+@dataclass
+class EventMetrics:
+    published: Counter
+    slow_consumers: Counter
+
+
+event_metrics = EventMetrics(published=Counter(), slow_consumers=Counter())
+
+
+@dataclass
+class QueryStats:
+    statements: int = 0
+    seconds: float = 0.0
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+@dataclass
+class Histogram:
+    buckets: tuple
+    counts: list = field(init=False)
+    count: int = 0
+    total: float = 0.0
+
+    def __post_init__(self):
+        self.counts = [0] * len(self.buckets)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+
+
+@dataclass
+class RouteMetrics:
+    latency: Histogram = field(
+        default_factory=lambda: Histogram(LATENCY_BUCKETS)
+    )
+    statements: Histogram = field(
+        default_factory=lambda: Histogram(STATEMENT_BUCKETS)
+    )
+    db_time: Summary = field(default_factory=Summary)
+    responses: dict = field(default_factory=lambda: defaultdict(Counter))
+
+
+@dataclass
+class HttpMetrics:
+    routes: dict = field(default_factory=lambda: defaultdict(RouteMetrics))
+
+    def observe(
+        self, route: tuple, status: int, seconds: float, queries: QueryStats
+    ):
+        metrics = self.routes[route]
+        metrics.latency.observe(seconds)
+        metrics.statements.observe(queries.statements)
+        metrics.db_time.observe(queries.seconds)
+        metrics.responses[status].inc()
+
+
+http_metrics = HttpMetrics()
+
+
+def _escape(label):
+    return (
+        str(label)
+        .replace('\\', '\\\\')
+        .replace('"', '\\"')
+        .replace('\n', '\\n')
+    )
+
+
+def _sample(name: str, value, **labels):
+    if not labels:
+        return f'{name} {value}'
+
+    rendered = ','.join(
+        f'{key}="{_escape(label)}"' for key, label in labels.items()
+    )
+    return f'{name}{{{rendered}}} {value}'
+
+
+def _family(name: str, kind: str, description: str, samples):
+    return [f'# HELP {name} {description}', f'# TYPE {name} {kind}', *samples]
+
+
+def _summary_samples(name: str, summary: Summary, **labels):
+    return [
+        _sample(f'{name}_sum', summary.total, **labels),
+        _sample(f'{name}_count', summary.count, **labels),
+    ]
+
+
+def _histogram_samples(name: str, histogram: Histogram, **labels):
+    samples, cumulative = [], 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        samples.append(
+            _sample(f'{name}_bucket', cumulative, **labels, le=bound)
+        )
+
+    return [
+        *samples,
+        _sample(f'{name}_bucket', histogram.count, **labels, le='+Inf'),
+        _sample(f'{name}_sum', histogram.total, **labels),
+        _sample(f'{name}_count', histogram.count, **labels),
+    ]
+
+
+def _http_families():
+    requests, latency, statements, db_time = [], [], [], []
+    for (method, route), metrics in sorted(http_metrics.routes.items()):
+        labels = {'method': method, 'route': route}
+        requests += [
+            _sample(
+                'fast_zero_http_requests_total',
+                counter.value,
+                **labels,
+                status=status,
+            )
+            for status, counter in sorted(metrics.responses.items())
+        ]
+        latency += _histogram_samples(
+            'fast_zero_http_request_duration_seconds',
+            metrics.latency,
+            **labels,
+        )
+        statements += _histogram_samples(
+            'fast_zero_http_request_db_statements',
+            metrics.statements,
+            **labels,
+        )
+        db_time += _summary_samples(
+            'fast_zero_http_request_db_seconds', metrics.db_time, **labels
+        )
+
+    return [
+        *_family(
+            'fast_zero_http_requests_total',
+            'counter',
+            'HTTP requests by route and status.',
+            requests,
+        ),
+        *_family(
+            'fast_zero_http_request_duration_seconds',
+            'histogram',
+            'HTTP request latency.',
+            latency,
+        ),
+        *_family(
+            'fast_zero_http_request_db_statements',
+            'histogram',
+            'SQL statements executed per HTTP request.',
+            statements,
+        ),
+        *_family(
+            'fast_zero_http_request_db_seconds',
+            'summary',
+            'Time spent in SQL statements per HTTP request.',
+            db_time,
+        ),
+    ]
+
+
+def _pool_families(pool: dict):
+    gauges = [
+        line
+        for key in ('size', 'checked_out', 'overflow', 'capacity')
+        if key in pool
+        for line in _family(
+            f'fast_zero_db_pool_{key}',
+            'gauge',
+            f'Database connection pool {key.replace("_", " ")}.',
+            [_sample(f'fast_zero_db_pool_{key}', pool[key])],
+        )
+    ]
+
+    return [
+        *gauges,
+        *_family(
+            'fast_zero_db_pool_checkout_wait_seconds',
+            'summary',
+            'Time spent waiting for a pooled connection.',
+            _summary_samples(
+                'fast_zero_db_pool_checkout_wait_seconds',
+                database_pool_metrics.checkout_wait,
+            ),
+        ),
+        *_family(
+            'fast_zero_db_pool_checkout_timeouts_total',
+            'counter',
+            'Pool checkouts that timed out.',
+            [
+                _sample(
+                    'fast_zero_db_pool_checkout_timeouts_total',
+                    database_pool_metrics.checkout_timeouts.value,
+                )
+            ],
+        ),
+    ]
+
+
+def _worker_families():
+    return [
+        *_family(
+            'fast_zero_password_hash_queue_wait_seconds',
+            'summary',
+            'Time password jobs waited for a worker.',
+            _summary_samples(
+                'fast_zero_password_hash_queue_wait_seconds',
+                password_hash_metrics.queue_wait,
+            ),
+        ),
+        *_family(
+            'fast_zero_password_hash_seconds',
+            'summary',
+            'Time spent hashing or verifying passwords.',
+            _summary_samples(
+                'fast_zero_password_hash_seconds',
+                password_hash_metrics.hash_time,
+            ),
+        ),
+        *_family(
+            'fast_zero_password_hash_rejected_total',
+            'counter',
+            'Password jobs rejected because the queue was full.',
+            [
+                _sample(
+                    'fast_zero_password_hash_rejected_total',
+                    password_hash_metrics.rejected.value,
+                )
+            ],
+        ),
+        *_family(
+            'fast_zero_events_published_total',
+            'counter',
+            'Todo change events published.',
+            [
+                _sample(
+                    'fast_zero_events_published_total',
+                    event_metrics.published.value,
+                )
+            ],
+        ),
+        *_family(
+            'fast_zero_events_slow_consumers_total',
+            'counter',
+            'Event subscribers dropped for falling behind.',
+            [
+                _sample(
+                    'fast_zero_events_slow_consumers_total',
+                    event_metrics.slow_consumers.value,
+                )
+            ],
+        ),
+    ]
+
+
+def render_metrics(pool: dict):
+    lines = [*_http_families(), *_pool_families(pool), *_worker_families()]
+    return '\n'.join(lines) + '\n'
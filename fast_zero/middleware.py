@@ -0,0 +1,141 @@
+import asyncio
+import cProfile
+import hmac
+import random
+import re
+import time
+import uuid
+from pathlib import Path
+
+from fast_zero.database import query_stats
+from fast_zero.metrics import QueryStats, http_metrics
+from fast_zero.settings import Settings
+
+PROFILE_TOKEN_HEADER = b'x-profile-token'
+PROFILE_ID_HEADER = b'x-profile-id'
+PROFILE_CONCURRENT_HEADER = b'x-profile-concurrent-requests'
+PROFILE_ID = re.compile(r'\d+-[0-9a-f]{8}')
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        stats = QueryStats()
+        token = query_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            query_stats.reset(token)
+            # The route template keeps label cardinality bounded.
+            route = scope.get('route')
+            path = route.path if route else 'unmatched'
+            http_metrics.observe(
+                (scope['method'], path), status, elapsed, stats
+            )
+
+
+class ProfileStore:
+    def __init__(self, directory: str, max_files: int):
+        self.directory = Path(directory)
+        self.max_files = max_files
+
+    def save(self, profile: cProfile.Profile, profile_id: str):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        profile.dump_stats(self.directory / f'{profile_id}.prof')
+
+        # Ids start with a nanosecond timestamp, so name order is age order
+        # and the ring drops the oldest files first.
+        profiles = sorted(self.directory.glob('*.prof'))
+        for path in profiles[: -self.max_files]:
+            path.unlink(missing_ok=True)
+
+    def path(self, profile_id: str):
+        if not PROFILE_ID.fullmatch(profile_id):
+            return None
+
+        path = self.directory / f'{profile_id}.prof'
+        return path if path.is_file() else None
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, settings: Settings):
+        self.app = app
+        self.token = settings.PROFILING_TOKEN.encode()
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.store = ProfileStore(
+            settings.PROFILING_DIR, settings.PROFILING_MAX_FILES
+        )
+        # cProfile hooks the whole event-loop thread, so a profile also
+        # records whatever other requests run meanwhile. They are never held
+        # back for it; the response says how many overlapped instead.
+        self._lock = asyncio.Lock()
+        self._active = 0
+        self._started = 0
+
+    def _wanted(self, scope):
+        if self.token:
+            for name, value in scope['headers']:
+                if name == PROFILE_TOKEN_HEADER and hmac.compare_digest(
+                    value, self.token
+                ):
+                    return True
+
+        return random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        if self._wanted(scope) and not self._lock.locked():
+            async with self._lock:
+                await self._profile(scope, receive, send)
+            return
+
+        self._active += 1
+        self._started += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._active -= 1
+
+    async def _profile(self, scope, receive, send):
+        profile_id = f'{time.time_ns()}-{uuid.uuid4().hex[:8]}'
+        active, started = self._active, self._started
+
+        async def send_with_profile_id(message):
+            if message['type'] == 'http.response.start':
+                headers = [(PROFILE_ID_HEADER, profile_id.encode())]
+                # Requests in flight when the profile began plus those that
+                # started before the response did.
+                if concurrent := active + self._started - started:
+                    headers.append((
+                        PROFILE_CONCURRENT_HEADER,
+                        str(concurrent).encode(),
+                    ))
+                message['headers'] = [*message.get('headers', []), *headers]
+            await send(message)
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profile.disable()
+            await asyncio.to_thread(self.store.save, profile, profile_id)
@@ -1,29 +1,52 @@
 from datetime import datetime
 from enum import Enum
 
-from sqlalchemy import ForeignKey, func
+from sqlalchemy import DateTime, ForeignKey, Index, text
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import Mapped, mapped_column, registry, relationship
+from sqlalchemy.sql.functions import FunctionElement
 
 table_registry = registry()
 
 
+class now(FunctionElement):
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(now)
+def _compile_now(element, compiler, **kw):
+    return 'now()'
+
+
+@compiles(now, 'sqlite')
+def _compile_now_sqlite(element, compiler, **kw):
+    # Same layout SQLAlchemy uses for bound datetimes, so timestamps compare
+    # correctly against parameters (CURRENT_TIMESTAMP drops the fraction).
+    return "strftime('%Y-%m-%d %H:%M:%f000', 'now')"
+
+
 @table_registry.mapped_as_dataclass
 class User:
     __tablename__ = 'users'
+    __mapper_args__ = {'eager_defaults': True}
 
     id: Mapped[int] = mapped_column(primary_key=True, init=False)
     username: Mapped[str] = mapped_column(unique=True)
     email: Mapped[str] = mapped_column(unique=True)
     password: Mapped[str]
     created_at: Mapped[datetime] = mapped_column(
-        init=False, server_default=func.now()
+        init=False, server_default=now()
     )
     updated_at: Mapped[datetime] = mapped_column(
-        init=False, server_default=func.now(), onupdate=func.now()
+        init=False, server_default=now(), onupdate=now()
     )
 
     todos: Mapped[list['Todo']] = relationship(
-        init=False, cascade='all, delete-orphan', lazy='selectin'
+        init=False,
+        cascade='all, delete-orphan',
+        lazy='raise',
+        passive_deletes=True,
     )
 
 
@@ -38,19 +61,82 @@ class TodoState(str, Enum):
 @table_registry.mapped_as_dataclass
 class Todo:
     __tablename__ = 'todos'
+    __table_args__ = (
+        Index('ix_todos_user_id_id', 'user_id', 'id'),
+        Index('ix_todos_user_id_state_id', 'user_id', 'state', 'id'),
+        Index('ix_todos_user_id_change_seq_id', 'user_id', 'change_seq', 'id'),
+        Index(
+            'ix_todos_search',
+            text(
+                "to_tsvector('simple'::regconfig, title || ' ' || description)"
+            ),
+            postgresql_using='gin',
+        ).ddl_if(dialect='postgresql'),
+    )
+    __mapper_args__ = {'eager_defaults': True}
 
     id: Mapped[int] = mapped_column(init=False, primary_key=True)
     title: Mapped[str]
     description: Mapped[str]
     state: Mapped[TodoState]
+    version: Mapped[int] = mapped_column(
+        init=False, default=1, server_default='1'
+    )
 
-    user_id: Mapped[int] = mapped_column(ForeignKey('users.id'))
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey('users.id', ondelete='CASCADE')
+    )
 
     user: Mapped[User] = relationship(init=False, back_populates='todos')
 
     created_at: Mapped[datetime] = mapped_column(
-        init=False, server_default=func.now()
+        init=False, server_default=now()
     )
     updated_at: Mapped[datetime] = mapped_column(
-        init=False, server_default=func.now(), onupdate=func.now()
+        init=False, server_default=now(), onupdate=now()
+    )
+    change_seq: Mapped[int] = mapped_column(default=0, server_default='0')
+
+
+@table_registry.mapped_as_dataclass
+class TodoTombstone:
+    __tablename__ = 'todo_tombstones'
+    __table_args__ = (
+        Index(
+            'ix_todo_tombstones_user_id_change_seq_id',
+            'user_id',
+            'change_seq',
+            'id',
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(init=False, primary_key=True)
+    todo_id: Mapped[int]
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey('users.id', ondelete='CASCADE')
+    )
+    deleted_at: Mapped[datetime] = mapped_column(
+        init=False, server_default=now()
+    )
+    change_seq: Mapped[int] = mapped_column(default=0, server_default='0')
+
+
+@table_registry.mapped_as_dataclass
+class TodoChange:
+    __tablename__ = 'todo_changes'
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey('users.id', ondelete='CASCADE'), primary_key=True
+    )
+    seq: Mapped[int] = mapped_column(default=0)
+
+
+@table_registry.mapped_as_dataclass
+class TodoCounter:
+    __tablename__ = 'todo_counters'
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey('users.id', ondelete='CASCADE'), primary_key=True
     )
+    state: Mapped[TodoState] = mapped_column(primary_key=True)
+    count: Mapped[int] = mapped_column(default=0)
@@ -0,0 +1,118 @@
+import base64
+import json
+from http import HTTPStatus
+
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fast_zero.schemas import FilterPage
+
+TOTAL_LABEL = 'total_count'
+
+
+def _encode_token(payload: dict):
+    payload = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def _decode_token(token: str):
+    padded = token + '=' * (-len(token) % 4)
+    payload = json.loads(base64.urlsafe_b64decode(padded))
+
+    if not isinstance(payload, dict):
+        raise TypeError
+    return payload
+
+
+def encode_cursor(last_id: int):
+    return _encode_token({'id': last_id})
+
+
+def decode_cursor(cursor: str):
+    try:
+        last_id = _decode_token(cursor)['id']
+    except (ValueError, KeyError, TypeError):
+        last_id = None
+
+    if not isinstance(last_id, int):
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST, detail='Invalid cursor'
+        )
+
+    return last_id
+
+
+def encode_sync_token(todos: tuple[int, int], deleted: tuple[int, int]):
+    return _encode_token({'todos': list(todos), 'deleted': list(deleted)})
+
+
+def _position(value):
+    seq, row_id = value
+    if not isinstance(seq, int) or not isinstance(row_id, int):
+        raise TypeError
+    return seq, row_id
+
+
+def decode_sync_token(token: str):
+    try:
+        payload = _decode_token(token)
+        return _position(payload['todos']), _position(payload['deleted'])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST, detail='Invalid sync token'
+        )
+
+
+def paginate(query, column, page: FilterPage):
+    query = query.order_by(column).limit(page.limit)
+
+    if page.cursor:
+        return query.where(column > decode_cursor(page.cursor))
+
+    return query.offset(page.offset)
+
+
+def next_cursor(items, page: FilterPage):
+    if len(items) < page.limit:
+        return None
+
+    return encode_cursor(items[-1].id)
+
+
+def count_query(query):
+    return select(func.count()).select_from(query.order_by(None).subquery())
+
+
+def with_total(page_query, query, page: FilterPage):
+    # A scalar subquery rather than count(*) OVER (): the window would
+    # only see the rows left after a keyset cursor.
+    if page.include_total != 'exact':
+        return page_query
+
+    total = count_query(query).scalar_subquery().label(TOTAL_LABEL)
+    return page_query.add_columns(total)
+
+
+async def estimate_count(session: AsyncSession, query):
+    compiled = query.order_by(None).compile(
+        dialect=session.bind.dialect, compile_kwargs={'literal_binds': True}
+    )
+    connection = await session.connection()
+    plan = await connection.exec_driver_sql(
+        f'EXPLAIN (FORMAT JSON) {compiled}'
+    )
+    return int(plan.scalar()[0]['Plan']['Plan Rows'])
+
+
+async def page_total(session: AsyncSession, query, rows, page: FilterPage):
+    if page.include_total is None:
+        return None
+
+    if page.include_total == 'estimated':
+        if session.bind.dialect.name == 'postgresql':
+            return await estimate_count(session, query)
+    elif rows:
+        return rows[0]._mapping[TOTAL_LABEL]
+
+    return await session.scalar(count_query(query))
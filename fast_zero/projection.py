@@ -0,0 +1,53 @@
+from http import HTTPStatus
+
+from fastapi import HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from fast_zero.pagination import TOTAL_LABEL
+
+
+def parse_fields(fields: str | None, schema: type[BaseModel]):
+    if not fields:
+        return list(schema.model_fields)
+
+    requested = {field.strip() for field in fields.split(',')} - {''}
+    unknown = requested - set(schema.model_fields)
+    if unknown:
+        raise HTTPException(
+            status_code=HTTPStatus.UNPROCESSABLE_ENTITY,
+            detail=f'Unknown fields: {", ".join(sorted(unknown))}',
+        )
+
+    return [
+        field
+        for field in schema.model_fields
+        if field in requested or field == 'id'
+    ]
+
+
+def select_columns(model, schema: type[BaseModel], fields: str | None = None):
+    return [getattr(model, field) for field in parse_fields(fields, schema)]
+
+
+def rows_as_dicts(rows):
+    return [
+        {
+            key: value
+            for key, value in row._mapping.items()
+            if key != TOTAL_LABEL
+        }
+        for row in rows
+    ]
+
+
+def sparse_response(
+    payload, fields: str | None, response: Response | None = None
+):
+    # Partial rows do not satisfy the response model, so they bypass it,
+    # keeping any headers already set on the injected response.
+    if fields:
+        headers = dict(response.headers) if response else None
+        return JSONResponse(jsonable_encoder(payload), headers=headers)
+    return payload
@@ -0,0 +1,110 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER = r'(?:\?|%s|%\(\w+\)s|\$\d+|:\w+)'
+IN_LIST = re.compile(rf'\(\s*{PLACEHOLDER}(?:\s*,\s*{PLACEHOLDER})*\s*\)')
+
+
+def statement_shape(statement: str):
+    # Expanding IN parameters render one placeholder per value, so lists
+    # of different lengths are folded into the same shape.
+    return IN_LIST.sub('(...)', ' '.join(statement.split()))
+
+
+def _redact_value(value):
+    return '<null>' if value is None else f'<{type(value).__name__}>'
+
+
+def redact(parameters, executemany: bool = False):
+    if executemany:
+        return f'<{len(parameters)} parameter sets>'
+    if isinstance(parameters, dict):
+        return {key: _redact_value(value) for key, value in parameters.items()}
+    return tuple(_redact_value(value) for value in parameters or ())
+
+
+class QueryLog:
+    def __init__(
+        self,
+        slow_threshold: float = 0.0,
+        max_statements: int = 0,
+        max_repeats: int = 0,
+    ):
+        self.slow_threshold = slow_threshold
+        self.max_statements = max_statements
+        self.max_repeats = max_repeats
+        self.statements = []
+        self.shapes = Counter()
+
+    def __len__(self):
+        return len(self.statements)
+
+    def record(
+        self, statement: str, parameters, seconds: float, executemany=False
+    ):
+        self.statements.append(statement)
+        self.shapes[statement_shape(statement)] += 1
+
+        if self.slow_threshold and seconds >= self.slow_threshold:
+            logger.warning(
+                'Slow query (%.3fs): %s parameters=%s',
+                seconds,
+                statement_shape(statement),
+                redact(parameters, executemany),
+            )
+
+    def problems(self):
+        problems = []
+        if self.max_statements and len(self) > self.max_statements:
+            problems.append(
+                f'{len(self)} statements exceed the limit of '
+                f'{self.max_statements}'
+            )
+
+        if self.max_repeats:
+            problems.extend(
+                f'Possible N+1: {repeats} executions of {shape}'
+                for shape, repeats in self.shapes.most_common()
+                if repeats > self.max_repeats
+            )
+
+        return problems
+
+    def report(self, label: str):
+        for problem in self.problems():
+            logger.warning('%s: %s', label, problem)
+
+
+@contextmanager
+def watch_engine(engine, log: QueryLog | None = None):
+    # Records every statement on the engine, whatever thread or task runs
+    # it; the per-request log in fast_zero.database only sees its own.
+    if log is None:
+        log = QueryLog()
+    sync_engine = getattr(engine, 'sync_engine', engine)
+
+    def before_cursor_execute(conn, *args):
+        conn.info['query_log_started'] = time.perf_counter()
+
+    def after_cursor_execute(conn, cursor, statement, parameters, *args):
+        started = conn.info.pop('query_log_started', time.perf_counter())
+        log.record(
+            statement, parameters, time.perf_counter() - started, *args[1:]
+        )
+
+    event.listen(sync_engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(sync_engine, 'after_cursor_execute', after_cursor_execute)
+    try:
+        yield log
+    finally:
+        event.remove(
+            sync_engine, 'before_cursor_execute', before_cursor_execute
+        )
+        event.remove(sync_engine, 'after_cursor_execute', after_cursor_execute)
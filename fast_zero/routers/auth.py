@@ -10,16 +10,17 @@ from fast_zero.database import get_session
 from fast_zero.models import User
 from fast_zero.schemas import Token
 from fast_zero.security import (
+    Principal,
     create_access_token,
     get_current_user,
-    verify_password,
+    verify_password_async,
 )
 
 router = APIRouter(prefix='/auth', tags=['auth'])
 
 T_Session = Annotated[AsyncSession, Depends(get_session)]
 T_OAuth2Form = Annotated[OAuth2PasswordRequestForm, Depends()]
-T_CurrentUser = Annotated[User, Depends(get_current_user)]
+T_CurrentUser = Annotated[Principal, Depends(get_current_user)]
 
 
 @router.post('/token', response_model=Token)
@@ -37,7 +38,7 @@ async def login_for_access_token(
             detail='Incorrect e-mail or password',
         )
 
-    if not verify_password(form_data.password, user.password):
+    if not await verify_password_async(form_data.password, user.password):
         raise HTTPException(
             status_code=HTTPStatus.UNAUTHORIZED,
             detail='Incorrect e-mail or password',
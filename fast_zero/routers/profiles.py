@@ -0,0 +1,50 @@
+import hmac
+from http import HTTPStatus
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import FileResponse
+
+from fast_zero.middleware import ProfileStore
+from fast_zero.settings import Settings
+
+settings = Settings()
+
+store = ProfileStore(settings.PROFILING_DIR, settings.PROFILING_MAX_FILES)
+
+
+def verify_profile_token(
+    x_profile_token: Annotated[str | None, Header()] = None,
+):
+    if not (
+        settings.PROFILING_TOKEN
+        and x_profile_token
+        and hmac.compare_digest(
+            x_profile_token.encode(), settings.PROFILING_TOKEN.encode()
+        )
+    ):
+        raise HTTPException(
+            status_code=HTTPStatus.FORBIDDEN, detail='Not enough permissions'
+        )
+
+
+router = APIRouter(
+    prefix='/profiles',
+    tags=['profiles'],
+    dependencies=[Depends(verify_profile_token)],
+)
+
+
+@router.get('/{profile_id}', response_class=FileResponse)
+def download_profile(profile_id: str):
+    path = store.path(profile_id)
+    if path is None:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND, detail='Profile not found'
+        )
+
+    return FileResponse(
+        path,
+        media_type='application/octet-stream',
+        filename=path.name,
+    )
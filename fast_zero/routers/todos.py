@@ -1,26 +1,76 @@
 from http import HTTPStatus
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete, insert, select, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from fast_zero.conditional import (
+    ConditionalGet,
+    VersionPrecondition,
+    conditional_get,
+    version_precondition,
+    weak_etag,
+)
+from fast_zero.counters import (
+    adjust_counters,
+    next_change,
+    read_change,
+    read_counters,
+    state_deltas,
+)
 from fast_zero.database import get_session
-from fast_zero.models import Todo, User
+from fast_zero.events import broker
+from fast_zero.models import Todo, TodoTombstone
+from fast_zero.pagination import (
+    decode_sync_token,
+    encode_sync_token,
+    next_cursor,
+    page_total,
+    paginate,
+    with_total,
+)
+from fast_zero.projection import (
+    rows_as_dicts,
+    select_columns,
+    sparse_response,
+)
 from fast_zero.schemas import (
+    FilterSync,
     FilterTodo,
     Message,
+    TodoBatch,
+    TodoBatchResult,
+    TodoImportResult,
     TodoList,
     TodoPublic,
     TodoSchema,
+    TodoSummary,
+    TodoSync,
     TodoUpdate,
 )
-from fast_zero.security import get_current_user
+from fast_zero.search import search_todos
+from fast_zero.security import Principal, get_current_user
+from fast_zero.settings import Settings
+from fast_zero.transfer import (
+    MEDIA_TYPES,
+    TransferFormat,
+    export_todos,
+    import_todos,
+    read_todos,
+)
+
+settings = Settings()
 
 # typing
 T_Session = Annotated[AsyncSession, Depends(get_session)]
-T_CurrentUser = Annotated[User, Depends(get_current_user)]
+T_CurrentUser = Annotated[Principal, Depends(get_current_user)]
 T_TodoFilter = Annotated[FilterTodo, Query()]
+T_SyncFilter = Annotated[FilterSync, Query()]
+T_Precondition = Annotated[VersionPrecondition, Depends(version_precondition)]
+T_ConditionalGet = Annotated[ConditionalGet, Depends(conditional_get)]
+T_TransferFormat = Annotated[TransferFormat, Query(alias='format')]
 
 router = APIRouter(prefix='/todos', tags=['todos'])
 
@@ -34,20 +84,29 @@ async def create_todo(
         description=todo.description,
         state=todo.state,
         user_id=user.id,
+        change_seq=await next_change(session, user.id),
     )
 
     session.add(db_todo)
+    await adjust_counters(session, user.id, state_deltas(added=[todo.state]))
+    await broker.publish(
+        session, user.id, [('todo.created', _event_data(db_todo))]
+    )
     await session.commit()
-    await session.refresh(db_todo)
 
     return db_todo
 
 
 @router.get('/', status_code=HTTPStatus.OK, response_model=TodoList)
 async def list_todos(
-    session: T_Session, user: T_CurrentUser, todo_filter: T_TodoFilter
+    session: T_Session,
+    user: T_CurrentUser,
+    todo_filter: T_TodoFilter,
+    conditional: T_ConditionalGet,
 ):
-    query = select(Todo).where(Todo.user_id == user.id)
+    query = select(
+        *select_columns(Todo, TodoPublic, todo_filter.fields)
+    ).where(Todo.user_id == user.id)
 
     if todo_filter.title:
         query = query.filter(Todo.title.contains(todo_filter.title))
@@ -60,26 +119,170 @@ async def list_todos(
     if todo_filter.state:
         query = query.filter(Todo.state == todo_filter.state)
 
+    if todo_filter.q:
+        query = search_todos(query, todo_filter.q, session.bind.dialect.name)
+
+    # Every todo write bumps the user's change counter in its own
+    # transaction, so the counter identifies the listing without a scan.
+    seq = await read_change(session, user.id)
+
+    etag = weak_etag(user.id, seq, todo_filter.model_dump())
+    if not_modified := conditional.not_modified(etag):
+        return not_modified
+
+    page_query = paginate(query, Todo.id, todo_filter)
+    todos = await session.execute(with_total(page_query, query, todo_filter))
+
+    todos = todos.all()
+    cursor = None if todo_filter.q else next_cursor(todos, todo_filter)
+    payload = {
+        'todos': rows_as_dicts(todos),
+        'size': len(todos),
+        'next_cursor': cursor,
+        'total': await page_total(session, query, todos, todo_filter),
+    }
+    return sparse_response(payload, todo_filter.fields, conditional.response)
+
+
+@router.get('/sync', status_code=HTTPStatus.OK, response_model=TodoSync)
+async def sync_todos(
+    session: T_Session, user: T_CurrentUser, sync_filter: T_SyncFilter
+):
+    tombstones = []
+
+    if sync_filter.token:
+        todo_position, tombstone_position = decode_sync_token(
+            sync_filter.token
+        )
+        tombstones = await session.execute(
+            select(
+                TodoTombstone.change_seq,
+                TodoTombstone.id,
+                TodoTombstone.todo_id,
+            )
+            .where(
+                TodoTombstone.user_id == user.id,
+                tuple_(TodoTombstone.change_seq, TodoTombstone.id)
+                > tombstone_position,
+            )
+            .order_by(TodoTombstone.change_seq, TodoTombstone.id)
+            .limit(sync_filter.limit)
+        )
+        tombstones = tombstones.all()
+    else:
+        # The first sync downloads the live list, so only deletions from
+        # here on are relevant to the client.
+        todo_position = (-1, 0)
+        tombstone_position = (await read_change(session, user.id) + 1, 0)
+
     todos = await session.scalars(
-        query.offset(todo_filter.offset).limit(todo_filter.limit)
+        select(Todo)
+        .where(
+            Todo.user_id == user.id,
+            tuple_(Todo.change_seq, Todo.id) > todo_position,
+        )
+        .order_by(Todo.change_seq, Todo.id)
+        .limit(sync_filter.limit)
     )
-
     todos = todos.all()
-    return {'todos': todos, 'size': len(todos)}
+
+    if todos:
+        todo_position = (todos[-1].change_seq, todos[-1].id)
+    if tombstones:
+        tombstone_position = (tombstones[-1].change_seq, tombstones[-1].id)
+
+    return {
+        'todos': todos,
+        'deleted': [tombstone.todo_id for tombstone in tombstones],
+        'token': encode_sync_token(todo_position, tombstone_position),
+        'has_more': sync_filter.limit in {len(todos), len(tombstones)},
+    }
+
+
+@router.get('/summary', status_code=HTTPStatus.OK, response_model=TodoSummary)
+async def todo_summary(session: T_Session, user: T_CurrentUser):
+    states = await read_counters(session, user.id)
+
+    return {'total': sum(states.values()), 'states': states}
+
+
+@router.get('/export', response_class=StreamingResponse)
+async def export_todos_file(
+    session: T_Session,
+    user: T_CurrentUser,
+    export_format: T_TransferFormat = 'ndjson',
+):
+    return StreamingResponse(
+        export_todos(
+            session.bind,
+            user.id,
+            export_format,
+            settings.TODO_EXPORT_CHUNK_SIZE,
+        ),
+        media_type=MEDIA_TYPES[export_format],
+        headers={
+            'Content-Disposition': (
+                f'attachment; filename="todos.{export_format}"'
+            )
+        },
+    )
+
+
+@router.post(
+    '/import', status_code=HTTPStatus.OK, response_model=TodoImportResult
+)
+async def import_todos_file(
+    request: Request,
+    session: T_Session,
+    user: T_CurrentUser,
+    import_format: T_TransferFormat = 'ndjson',
+):
+    return await import_todos(
+        session,
+        user.id,
+        read_todos(request.stream(), import_format),
+        settings.TODO_IMPORT_CHUNK_SIZE,
+        settings.TODO_IMPORT_MAX_ERRORS,
+    )
+
+
+@router.get('/events', response_class=StreamingResponse)
+async def todo_events(user: T_CurrentUser):
+    return StreamingResponse(
+        broker.listen(user.id, settings.EVENTS_KEEPALIVE),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
 
 
 @router.delete('/{todo_id}', status_code=HTTPStatus.OK, response_model=Message)
-async def delete_todo(todo_id: int, session: T_Session, user: T_CurrentUser):
-    db_todo = await session.scalar(
-        select(Todo).where(Todo.user_id == user.id).where(Todo.id == todo_id)
+async def delete_todo(
+    todo_id: int,
+    session: T_Session,
+    user: T_CurrentUser,
+    precondition: T_Precondition,
+):
+    change_seq = await next_change(session, user.id)
+    conditions = _todo_conditions(todo_id, user, precondition)
+    deleted = await session.execute(
+        delete(Todo).where(*conditions).returning(Todo.id, Todo.state)
     )
+    deleted = deleted.first()
 
-    if not db_todo:
-        raise HTTPException(
-            status_code=HTTPStatus.NOT_FOUND, detail='Todo not found'
-        )
+    if not deleted:
+        await _raise_missing_todo(session, todo_id, user, precondition)
 
-    await session.delete(db_todo)
+    await session.execute(
+        insert(TodoTombstone).values(
+            todo_id=deleted.id, user_id=user.id, change_seq=change_seq
+        )
+    )
+    await adjust_counters(
+        session, user.id, state_deltas(removed=[deleted.state])
+    )
+    await broker.publish(
+        session, user.id, [('todo.deleted', {'id': deleted.id})]
+    )
     await session.commit()
 
     return {'message': 'Todo deleted'}
@@ -89,22 +292,240 @@ async def delete_todo(todo_id: int, session: T_Session, user: T_CurrentUser):
     '/{todo_id}', status_code=HTTPStatus.OK, response_model=TodoPublic
 )
 async def patch_todo(
-    todo_id: int, todo: TodoUpdate, session: T_Session, user: T_CurrentUser
+    todo_id: int,
+    todo: TodoUpdate,
+    session: T_Session,
+    user: T_CurrentUser,
+    precondition: T_Precondition,
 ):
-    db_todo = await session.scalar(
-        select(Todo).where(Todo.user_id == user.id).where(Todo.id == todo_id)
-    )
+    values = todo.model_dump(exclude_unset=True)
+    conditions = _todo_conditions(todo_id, user, precondition)
 
-    if not db_todo:
-        raise HTTPException(
-            status_code=HTTPStatus.NOT_FOUND, detail='Todo not found'
+    if values:
+        values['change_seq'] = await next_change(session, user.id)
+        db_todo, previous_state = await _update_todo(
+            session, values, conditions
         )
+    else:
+        db_todo = await session.scalar(select(Todo).where(*conditions))
+        previous_state = None
 
-    for key, value in todo.model_dump(exclude_unset=True).items():
-        setattr(db_todo, key, value)
+    if not db_todo:
+        await _raise_missing_todo(session, todo_id, user, precondition)
 
-    session.add(db_todo)
+    if previous_state is not None:
+        await adjust_counters(
+            session,
+            user.id,
+            state_deltas(added=[db_todo.state], removed=[previous_state]),
+        )
+    if values:
+        await broker.publish(
+            session, user.id, [('todo.updated', _event_data(db_todo))]
+        )
     await session.commit()
-    await session.refresh(db_todo)
+
+    precondition.set_etag(db_todo.version)
 
     return db_todo
+
+
+async def _update_todo(session: AsyncSession, values: dict, conditions: list):
+    query = update(Todo).values(**values, version=Todo.version + 1)
+    if 'state' not in values:
+        db_todo = await session.scalar(
+            query.where(*conditions).returning(Todo)
+        )
+        return db_todo, None
+
+    if session.bind.dialect.name == 'postgresql':
+        # The locked self-join hands back the state this UPDATE replaced,
+        # so the ownership check, the write and the old state stay a
+        # single statement.
+        previous = (
+            select(Todo.id, Todo.state)
+            .where(*conditions)
+            .with_for_update()
+            .subquery('previous')
+        )
+        updated = await session.execute(
+            query.where(Todo.id == previous.c.id).returning(
+                Todo, previous.c.state
+            )
+        )
+        return updated.first() or (None, None)
+
+    # SQLite cannot RETURN columns of an UPDATE ... FROM table. The write
+    # lock taken by next_change is held already, so reading first is safe.
+    previous_state = await session.scalar(
+        select(Todo.state).where(*conditions)
+    )
+    db_todo = await session.scalar(query.where(*conditions).returning(Todo))
+    return db_todo, previous_state
+
+
+def _event_data(todo: Todo):
+    data = TodoPublic.model_validate(todo, from_attributes=True)
+    return data.model_dump(mode='json')
+
+
+def _todo_conditions(
+    todo_id: int, user: Principal, precondition: VersionPrecondition
+):
+    conditions = [Todo.user_id == user.id, Todo.id == todo_id]
+
+    if precondition.expected is not None:
+        conditions.append(Todo.version == precondition.expected)
+
+    return conditions
+
+
+async def _raise_missing_todo(
+    session: AsyncSession,
+    todo_id: int,
+    user: Principal,
+    precondition: VersionPrecondition,
+):
+    if precondition.expected is not None and await session.scalar(
+        select(Todo.id).where(Todo.user_id == user.id, Todo.id == todo_id)
+    ):
+        raise HTTPException(
+            status_code=HTTPStatus.PRECONDITION_FAILED,
+            detail='Todo was modified by another request',
+        )
+
+    raise HTTPException(
+        status_code=HTTPStatus.NOT_FOUND, detail='Todo not found'
+    )
+
+
+@router.post(
+    '/batch', status_code=HTTPStatus.OK, response_model=TodoBatchResult
+)
+async def batch_todos(
+    batch: TodoBatch, session: T_Session, user: T_CurrentUser
+):
+    operations = len(batch.create) + len(batch.update) + len(batch.delete)
+    if operations > settings.TODO_BATCH_MAX_OPERATIONS:
+        raise HTTPException(
+            status_code=HTTPStatus.UNPROCESSABLE_ENTITY,
+            detail=(
+                'Batch is limited to '
+                f'{settings.TODO_BATCH_MAX_OPERATIONS} operations'
+            ),
+        )
+
+    changes = {
+        todo.id: todo.model_dump(exclude_unset=True, exclude={'id'})
+        for todo in batch.update
+    }
+    # Entries without fields only need the ownership check; a batch of
+    # nothing else must not bump the change counter.
+    if batch.create or batch.delete or any(changes.values()):
+        change_seq = await next_change(session, user.id)
+
+    created = []
+    if batch.create:
+        created = await session.scalars(
+            insert(Todo).returning(Todo),
+            [
+                todo.model_dump()
+                | {'user_id': user.id, 'change_seq': change_seq}
+                for todo in batch.create
+            ],
+        )
+        created = sorted(created.all(), key=lambda todo: todo.id)
+
+    owned, updated = {}, []
+    if changes:
+        owned = await session.execute(
+            select(Todo.id, Todo.state)
+            .where(Todo.user_id == user.id, Todo.id.in_(changes))
+            .with_for_update()
+        )
+        owned = dict(owned.all())
+
+        # Todos deleted by the same batch are only reported as deleted.
+        rows = [
+            {'id': todo_id, 'change_seq': change_seq} | values
+            for todo_id, values in changes.items()
+            if todo_id in owned and values and todo_id not in batch.delete
+        ]
+        if rows:
+            written = [row['id'] for row in rows]
+            await session.execute(update(Todo), rows)
+            await session.execute(
+                update(Todo)
+                .where(Todo.id.in_(written))
+                .values(version=Todo.version + 1)
+                .execution_options(synchronize_session=False)
+            )
+            updated = await session.scalars(
+                select(Todo)
+                .where(Todo.id.in_(written))
+                .order_by(Todo.id)
+                .execution_options(populate_existing=True)
+            )
+            updated = updated.all()
+
+    deleted = {}
+    if batch.delete:
+        deleted = await session.execute(
+            delete(Todo)
+            .where(Todo.user_id == user.id, Todo.id.in_(batch.delete))
+            .returning(Todo.id, Todo.state)
+        )
+        deleted = dict(deleted.all())
+
+    if deleted:
+        await session.execute(
+            insert(TodoTombstone),
+            [
+                {
+                    'todo_id': todo_id,
+                    'user_id': user.id,
+                    'change_seq': change_seq,
+                }
+                for todo_id in deleted
+            ],
+        )
+
+    # Updated rows cancel out unless their state changed.
+    await adjust_counters(
+        session,
+        user.id,
+        state_deltas(
+            added=[todo.state for todo in [*created, *updated]],
+            removed=[*(owned[todo.id] for todo in updated), *deleted.values()],
+        ),
+    )
+
+    await broker.publish(
+        session,
+        user.id,
+        [
+            *(('todo.created', _event_data(todo)) for todo in created),
+            *(('todo.updated', _event_data(todo)) for todo in updated),
+            *(('todo.deleted', {'id': todo_id}) for todo_id in deleted),
+        ],
+    )
+
+    if created or updated or deleted:
+        await session.commit()
+    else:
+        # Nothing matched, so the counter bump is undone with the rest.
+        await session.rollback()
+
+    found = set(owned) | set(deleted)
+    not_found = [
+        todo_id
+        for todo_id in [*changes, *batch.delete]
+        if todo_id not in found
+    ]
+
+    return {
+        'created': created,
+        'updated': updated,
+        'deleted': list(deleted),
+        'not_found': not_found,
+    }
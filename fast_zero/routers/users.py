@@ -1,85 +1,119 @@
 from http import HTTPStatus
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from sqlalchemy import delete, select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from fast_zero.conditional import ConditionalGet, conditional_get, weak_etag
 from fast_zero.database import get_session
-from fast_zero.models import User
+from fast_zero.models import Todo, User
+from fast_zero.pagination import (
+    next_cursor,
+    page_total,
+    paginate,
+    with_total,
+)
+from fast_zero.projection import (
+    rows_as_dicts,
+    select_columns,
+    sparse_response,
+)
 from fast_zero.schemas import (
     FilterPage,
     Message,
+    SparseFields,
     UserList,
     UserPublic,
     UserSchema,
 )
 from fast_zero.security import (
+    Principal,
     get_current_user,
-    get_password_hash,
+    get_password_hash_async,
+    principal_cache,
 )
+from fast_zero.settings import Settings
+
+settings = Settings()
 
 router = APIRouter(prefix='/users', tags=['users'])
 
 T_Session = Annotated[AsyncSession, Depends(get_session)]
-T_CurrentUser = Annotated[User, Depends(get_current_user)]
+T_CurrentUser = Annotated[Principal, Depends(get_current_user)]
 T_filterPage = Annotated[FilterPage, Query()]
+T_Fields = Annotated[SparseFields, Query()]
+T_ConditionalGet = Annotated[ConditionalGet, Depends(conditional_get)]
 
 
 @router.post('/', status_code=HTTPStatus.CREATED, response_model=UserPublic)
 async def create_user(user: UserSchema, session: T_Session):
-    db_user = await session.scalar(
-        select(User).where(
-            (User.email == user.email) | (User.username == user.username)
-        )
+    conflict_exception = HTTPException(
+        status_code=HTTPStatus.CONFLICT,
+        detail='User with this email or username already exists',
     )
 
-    if db_user:
-        raise HTTPException(
-            status_code=HTTPStatus.CONFLICT,
-            detail='User with this email or username already exists',
-        )
-
     db_user = User(
         username=user.username,
         email=user.email,
-        password=get_password_hash(user.password),
+        password=await get_password_hash_async(user.password),
     )
 
     session.add(db_user)
-    await session.commit()
-    await session.refresh(db_user)
+    try:
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        raise conflict_exception
 
     return db_user
 
 
 @router.get('/{user_id}', status_code=HTTPStatus.OK, response_model=UserPublic)
-async def get_user(user_id: int, session: T_Session):
-    db_user = await session.scalar(select(User).where(User.id == user_id))
+async def get_user(
+    user_id: int,
+    session: T_Session,
+    sparse: T_Fields,
+    conditional: T_ConditionalGet,
+):
+    columns = select_columns(User, UserPublic, sparse.fields)
+    db_user = await session.execute(
+        select(*columns, User.updated_at).where(User.id == user_id)
+    )
+    db_user = db_user.first()
 
     if not db_user:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail='User not found'
         )
 
-    return db_user
+    payload = db_user._asdict()
+    updated_at = payload.pop('updated_at')
+    etag = weak_etag(user_id, updated_at, sparse.fields)
+    if not_modified := conditional.not_modified(etag, updated_at):
+        return not_modified
+
+    return sparse_response(payload, sparse.fields, conditional.response)
 
 
 @router.get('/', status_code=HTTPStatus.OK, response_model=UserList)
 async def get_users(
     session: T_Session, current_user: T_CurrentUser, filter_users: T_filterPage
 ):
-    db_users = await session.scalars(
-        select(User).offset(filter_users.offset).limit(filter_users.limit)
+    query = select(*select_columns(User, UserPublic, filter_users.fields))
+    page_query = paginate(query, User.id, filter_users)
+    db_users = await session.execute(
+        with_total(page_query, query, filter_users)
     )
     db_users = db_users.all()
-    return {
-        'users': db_users,
+    payload = {
+        'users': rows_as_dicts(db_users),
         'size': len(db_users),
-        'limit': filter_users.limit,
-        'offset': filter_users.offset,
+        'next_cursor': next_cursor(db_users, filter_users),
+        'total': await page_total(session, query, db_users, filter_users),
     }
+    return sparse_response(payload, filter_users.fields)
 
 
 @router.put('/{user_id}', status_code=HTTPStatus.OK, response_model=UserPublic)
@@ -93,14 +127,19 @@ async def update_user(
         raise HTTPException(
             status_code=HTTPStatus.FORBIDDEN, detail='Not enough permissions'
         )
+
+    db_user = await session.scalar(select(User).where(User.id == user_id))
+
+    if not db_user:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND, detail='User not found'
+        )
+
     try:
-        current_user.username = user.username
-        current_user.password = get_password_hash(user.password)
-        current_user.email = user.email
+        db_user.username = user.username
+        db_user.password = await get_password_hash_async(user.password)
+        db_user.email = user.email
         await session.commit()
-        await session.refresh(current_user)
-
-        return current_user
 
     except IntegrityError:
         raise HTTPException(
@@ -108,6 +147,10 @@ async def update_user(
             detail='Username or Email already exists',
         )
 
+    principal_cache.invalidate(current_user.email)
+
+    return db_user
+
 
 @router.delete('/{user_id}', status_code=HTTPStatus.OK, response_model=Message)
 async def delete_user(
@@ -120,12 +163,61 @@ async def delete_user(
             status_code=HTTPStatus.FORBIDDEN, detail='Not enough permissions'
         )
 
-    db_user = await session.scalar(select(User).where(User.id == user_id))
+    deleted = await session.scalar(
+        delete(User).where(User.id == user_id).returning(User.id)
+    )
 
-    if not db_user:
+    if not deleted:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail='User not found'
         )
-    await session.delete(db_user)
     await session.commit()
+
+    principal_cache.invalidate(current_user.email)
+
     return {'message': 'User deleted'}
+
+
+@router.post(
+    '/{user_id}/purge',
+    status_code=HTTPStatus.ACCEPTED,
+    response_model=Message,
+)
+async def purge_user(
+    user_id: int,
+    session: T_Session,
+    current_user: T_CurrentUser,
+    background_tasks: BackgroundTasks,
+):
+    if current_user.id != user_id:
+        raise HTTPException(
+            status_code=HTTPStatus.FORBIDDEN, detail='Not enough permissions'
+        )
+
+    background_tasks.add_task(
+        purge_user_data, session.bind, user_id, settings.USER_PURGE_BATCH_SIZE
+    )
+    principal_cache.invalidate(current_user.email)
+
+    return {'message': 'User deletion scheduled'}
+
+
+async def purge_user_data(bind, user_id: int, batch_size: int):
+    async with AsyncSession(bind, expire_on_commit=False) as session:
+        while True:
+            batch = (
+                select(Todo.id)
+                .where(Todo.user_id == user_id)
+                .limit(batch_size)
+                .scalar_subquery()
+            )
+            result = await session.execute(
+                delete(Todo).where(Todo.id.in_(batch))
+            )
+            await session.commit()
+
+            if result.rowcount < batch_size:
+                break
+
+        await session.execute(delete(User).where(User.id == user_id))
+        await session.commit()
@@ -1,6 +1,13 @@
 from datetime import datetime
+from typing import Literal
 
-from pydantic import BaseModel, ConfigDict, EmailStr, Field
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    EmailStr,
+    Field,
+    model_validator,
+)
 
 from fast_zero.models import TodoState
 
@@ -30,6 +37,8 @@ class UserDB(UserSchema):
 class UserList(BaseModel):
     users: list[UserPublic]
     size: int
+    next_cursor: str | None = None
+    total: int | None = None
 
 
 class Token(BaseModel):
@@ -37,9 +46,27 @@ class Token(BaseModel):
     token_type: str
 
 
-class FilterPage(BaseModel):
+class SparseFields(BaseModel):
+    fields: str | None = Field(
+        default=None,
+        description=(
+            'Comma-separated list of fields to return, e.g. `id,title`. '
+            'The id is always included. Defaults to all fields.'
+        ),
+    )
+
+
+class FilterPage(SparseFields):
     offset: int = Field(ge=0, default=0)
     limit: int = Field(ge=1, default=100)
+    cursor: str | None = Field(default=None)
+    include_total: Literal['exact', 'estimated'] | None = Field(
+        default=None,
+        description=(
+            'Add the total number of matching rows. `estimated` uses '
+            'PostgreSQL planner statistics and is cheap on large tables.'
+        ),
+    )
 
 
 class TodoSchema(BaseModel):
@@ -50,6 +77,7 @@ class TodoSchema(BaseModel):
 
 class TodoPublic(TodoSchema):
     id: int
+    version: int
     created_at: datetime
     updated_at: datetime
 
@@ -58,14 +86,68 @@ class FilterTodo(FilterPage):
     title: str | None = Field(default=None, min_length=3, max_length=10)
     description: str | None = Field(default=None)
     state: TodoState | None = Field(default=None)
+    q: str | None = Field(default=None, min_length=1, max_length=100)
+
+    @model_validator(mode='after')
+    def search_uses_offset_pagination(self):
+        if self.q and self.cursor:
+            raise ValueError('cursor cannot be combined with q')
+        return self
 
 
 class TodoList(BaseModel):
     todos: list[TodoPublic]
     size: int
+    next_cursor: str | None = None
+    total: int | None = None
 
 
 class TodoUpdate(BaseModel):
     title: str | None = None
     description: str | None = None
     state: TodoState | None = None
+
+
+class TodoBatchUpdate(TodoUpdate):
+    id: int
+
+
+class TodoBatch(BaseModel):
+    create: list[TodoSchema] = Field(default_factory=list)
+    update: list[TodoBatchUpdate] = Field(default_factory=list)
+    delete: list[int] = Field(default_factory=list)
+
+
+class TodoBatchResult(BaseModel):
+    created: list[TodoPublic]
+    updated: list[TodoPublic]
+    deleted: list[int]
+    not_found: list[int]
+
+
+class FilterSync(BaseModel):
+    token: str | None = Field(default=None)
+    limit: int = Field(ge=1, default=100)
+
+
+class TodoSync(BaseModel):
+    todos: list[TodoPublic]
+    deleted: list[int]
+    token: str
+    has_more: bool
+
+
+class TodoImportError(BaseModel):
+    line: int
+    detail: str
+
+
+class TodoImportResult(BaseModel):
+    imported: int
+    failed: int
+    errors: list[TodoImportError]
+
+
+class TodoSummary(BaseModel):
+    total: int
+    states: dict[TodoState, int]
@@ -0,0 +1,24 @@
+from sqlalchemy import func, literal_column, or_
+from sqlalchemy.dialects.postgresql import to_tsvector, websearch_to_tsquery
+
+from fast_zero.models import Todo
+
+SEARCH_CONFIG = literal_column("'simple'::regconfig")
+
+# must match the ix_todos_search expression so PostgreSQL can use the index
+todo_search_document = to_tsvector(
+    SEARCH_CONFIG,
+    Todo.title.op('||')(literal_column("' '")).op('||')(Todo.description),
+)
+
+
+def search_todos(query, term: str, dialect: str):
+    if dialect == 'postgresql':
+        ts_query = websearch_to_tsquery(SEARCH_CONFIG, term)
+        return query.where(todo_search_document.op('@@')(ts_query)).order_by(
+            func.ts_rank(todo_search_document, ts_query).desc()
+        )
+
+    return query.where(
+        or_(Todo.title.contains(term), Todo.description.contains(term))
+    )
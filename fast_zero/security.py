@@ -1,4 +1,13 @@
+import asyncio
+import time
+from concurrent.futures import (
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from functools import cache
 from http import HTTPStatus
 from zoneinfo import ZoneInfo
 
@@ -9,7 +18,9 @@ from pwdlib import PasswordHash
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from fast_zero.cache import TTLCache
 from fast_zero.database import get_session
+from fast_zero.metrics import password_hash_metrics
 from fast_zero.models import User
 from fast_zero.settings import Settings
 
@@ -20,6 +31,18 @@ pwd_context = PasswordHash.recommended()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='auth/token')
 
 
+@dataclass(frozen=True, slots=True)
+class Principal:
+    id: int
+    email: str
+    username: str
+
+
+principal_cache = TTLCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE, ttl=settings.PRINCIPAL_CACHE_TTL
+)
+
+
 def get_password_hash(password: str):
     return pwd_context.hash(password)
 
@@ -28,6 +51,62 @@ def verify_password(plain_password: str, hashed_password: str):
     return pwd_context.verify(plain_password, hashed_password)
 
 
+@cache
+def _get_password_executor() -> Executor:
+    if settings.PASSWORD_HASH_EXECUTOR == 'process':
+        return ProcessPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS)
+
+    return ThreadPoolExecutor(
+        max_workers=settings.PASSWORD_HASH_WORKERS,
+        thread_name_prefix='password-hash',
+    )
+
+
+def _timed(func, *args):
+    started = time.monotonic()
+    result = func(*args)
+    return result, started, time.monotonic()
+
+
+async def _run_password_job(func, *args):
+    in_flight = password_hash_metrics.in_flight
+    capacity = (
+        settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_MAX_QUEUE
+    )
+    if in_flight.value >= capacity:
+        password_hash_metrics.rejected.inc()
+        raise HTTPException(
+            status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+            detail='Server busy, try again later',
+            headers={'Retry-After': '1'},
+        )
+
+    loop = asyncio.get_running_loop()
+    in_flight.inc()
+    submitted = time.monotonic()
+    try:
+        result, started, finished = await loop.run_in_executor(
+            _get_password_executor(), _timed, func, *args
+        )
+    finally:
+        in_flight.inc(-1)
+
+    password_hash_metrics.queue_wait.observe(started - submitted)
+    password_hash_metrics.hash_time.observe(finished - started)
+
+    return result
+
+
+async def get_password_hash_async(password: str):
+    return await _run_password_job(get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str):
+    return await _run_password_job(
+        verify_password, plain_password, hashed_password
+    )
+
+
 def create_access_token(data: dict):
     to_encode = data.copy()
 
@@ -65,11 +144,22 @@ async def get_current_user(
     except ExpiredSignatureError:
         raise credentials_exception
 
-    user = await session.scalar(
-        select(User).where(User.email == subject_email)
-    )
+    principal = principal_cache.get(subject_email)
+    if principal:
+        return principal
+
+    row = (
+        await session.execute(
+            select(User.id, User.email, User.username).where(
+                User.email == subject_email
+            )
+        )
+    ).first()
 
-    if not user:
+    if not row:
         raise credentials_exception
 
-    return user
+    principal = Principal(id=row.id, email=row.email, username=row.username)
+    principal_cache.set(subject_email, principal)
+
+    return principal
@@ -1,3 +1,6 @@
+from typing import Literal
+
+from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -10,3 +13,40 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
+
+    PASSWORD_HASH_EXECUTOR: Literal['thread', 'process'] = 'thread'
+    PASSWORD_HASH_WORKERS: int = Field(default=4, ge=1)
+    PASSWORD_HASH_MAX_QUEUE: int = Field(default=64, ge=0)
+
+    PRINCIPAL_CACHE_SIZE: int = 1024
+    PRINCIPAL_CACHE_TTL: float = 30.0
+
+    TODO_BATCH_MAX_OPERATIONS: int = 500
+
+    DATABASE_POOL_SIZE: int = 5
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_TIMEOUT: float = 30.0
+    DATABASE_POOL_RECYCLE: int = 1800
+    DATABASE_POOL_PRE_PING: bool = False
+    DATABASE_STATEMENT_TIMEOUT: int = 0
+    DATABASE_PGBOUNCER: bool = False
+
+    QUERY_SLOW_THRESHOLD: float = 0.5
+    QUERY_MAX_STATEMENTS: int = 50
+    QUERY_MAX_REPEATS: int = 10
+
+    PROFILING_ENABLED: bool = False
+    PROFILING_TOKEN: str = ''
+    PROFILING_SAMPLE_RATE: float = 0.0
+    PROFILING_DIR: str = 'profiles'
+    PROFILING_MAX_FILES: int = Field(default=20, ge=1)
+
+    USER_PURGE_BATCH_SIZE: int = 5000
+
+    EVENTS_BACKEND: Literal['memory', 'postgres'] = 'memory'
+    EVENTS_BUFFER_SIZE: int = 100
+    EVENTS_KEEPALIVE: float = 15.0
+
+    TODO_EXPORT_CHUNK_SIZE: int = 1000
+    TODO_IMPORT_CHUNK_SIZE: int = 5000
+    TODO_IMPORT_MAX_ERRORS: int = 100
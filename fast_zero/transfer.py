@@ -0,0 +1,207 @@
+import csv
+import io
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Literal
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from fast_zero.counters import adjust_counters, next_change, state_deltas
+from fast_zero.models import Todo
+from fast_zero.schemas import TodoSchema
+
+TransferFormat = Literal['ndjson', 'csv']
+
+MEDIA_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+EXPORT_COLUMNS = (
+    Todo.id,
+    Todo.title,
+    Todo.description,
+    Todo.state,
+    Todo.version,
+    Todo.created_at,
+    Todo.updated_at,
+)
+
+
+def _plain(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _ndjson_chunk(rows):
+    return ''.join(
+        json.dumps(
+            {key: _plain(value) for key, value in row._mapping.items()},
+            separators=(',', ':'),
+        )
+        + '\n'
+        for row in rows
+    )
+
+
+def _csv_chunk(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(
+        [_plain(value) for value in row] for row in rows
+    )
+    return buffer.getvalue()
+
+
+async def export_todos(
+    bind: AsyncEngine, user_id: int, fmt: TransferFormat, chunk_size: int
+):
+    if fmt == 'csv':
+        yield _csv_chunk([[column.key for column in EXPORT_COLUMNS]])
+        render = _csv_chunk
+    else:
+        render = _ndjson_chunk
+
+    # The request session is closed before the body is sent, so the
+    # export reads through its own session.
+    async with AsyncSession(bind) as session:
+        result = await session.stream(
+            select(*EXPORT_COLUMNS)
+            .where(Todo.user_id == user_id)
+            .order_by(Todo.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        async for rows in result.partitions():
+            yield render(rows)
+
+
+async def _numbered_lines(chunks):
+    number, pending = 0, b''
+    async for chunk in chunks:
+        *lines, pending = (pending + chunk).split(b'\n')
+        for line in lines:
+            number += 1
+            yield number, line
+
+    if pending:
+        yield number + 1, pending
+
+
+def _csv_record(header: list[str], text: str):
+    values = next(csv.reader([text]))
+    if len(values) != len(header):
+        raise ValueError(f'Expected {len(header)} columns, got {len(values)}')
+    return dict(zip(header, values))
+
+
+def _describe(exc: ValueError):
+    if isinstance(exc, ValidationError):
+        return '; '.join(
+            f'{".".join(map(str, error["loc"])) or "row"}: {error["msg"]}'
+            for error in exc.errors()
+        )
+    return str(exc)
+
+
+async def read_todos(chunks, fmt: TransferFormat):
+    header, record, start = None, '', 0
+
+    async for number, raw_line in _numbered_lines(chunks):
+        try:
+            line = raw_line.decode().rstrip('\r')
+        except UnicodeDecodeError:
+            yield number, 'Invalid UTF-8'
+            continue
+
+        if fmt == 'csv' and record:
+            record = f'{record}\n{line}'
+        else:
+            record, start = line, number
+
+        # An odd number of quotes means a quoted CSV field spans lines.
+        if fmt == 'csv' and record.count('"') % 2:
+            continue
+
+        text, record = record, ''
+        if not text.strip():
+            continue
+
+        if fmt == 'csv' and header is None:
+            header = next(csv.reader([text]))
+            continue
+
+        try:
+            data = (
+                json.loads(text)
+                if fmt == 'ndjson'
+                else _csv_record(header, text)
+            )
+            yield start, TodoSchema.model_validate(data)
+        except ValueError as exc:
+            yield start, _describe(exc)
+
+    if record:
+        yield start, 'Unterminated quoted field'
+
+
+async def _load_chunk(session: AsyncSession, user_id: int, rows: list[dict]):
+    change_seq = await next_change(session, user_id)
+    if session.bind.dialect.name == 'postgresql':
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        async with (
+            raw_connection.driver_connection.cursor() as cursor,
+            cursor.copy(
+                'COPY todos (title, description, state, user_id, change_seq)'
+                ' FROM STDIN'
+            ) as copy,
+        ):
+            for row in rows:
+                await copy.write_row((
+                    row['title'],
+                    row['description'],
+                    row['state'].value,
+                    row['user_id'],
+                    change_seq,
+                ))
+    else:
+        await session.execute(
+            insert(Todo), [row | {'change_seq': change_seq} for row in rows]
+        )
+
+    await adjust_counters(
+        session, user_id, state_deltas(added=[row['state'] for row in rows])
+    )
+    await session.commit()
+
+
+async def import_todos(
+    session: AsyncSession,
+    user_id: int,
+    todos,
+    chunk_size: int,
+    max_errors: int,
+):
+    result = {'imported': 0, 'failed': 0, 'errors': []}
+    rows = []
+
+    async for line, todo in todos:
+        if isinstance(todo, str):
+            result['failed'] += 1
+            if len(result['errors']) < max_errors:
+                result['errors'].append({'line': line, 'detail': todo})
+            continue
+
+        rows.append(todo.model_dump() | {'user_id': user_id})
+        if len(rows) >= chunk_size:
+            await _load_chunk(session, user_id, rows)
+            result['imported'] += len(rows)
+            rows = []
+
+    if rows:
+        await _load_chunk(session, user_id, rows)
+        result['imported'] += len(rows)
+
+    return result
@@ -0,0 +1,40 @@
+"""add todo search index
+
+Revision ID: 9d4b2a6c1e87
+Revises: 5c0e7f3b9a41
+Create Date: 2026-10-18 11:03:47.918264
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4b2a6c1e87'
+down_revision: Union[str, Sequence[str], None] = '5c0e7f3b9a41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_context().dialect.name != 'postgresql':
+        return
+
+    op.create_index(
+        'ix_todos_search',
+        'todos',
+        [sa.text("to_tsvector('simple'::regconfig, title || ' ' || description)")],
+        unique=False,
+        postgresql_using='gin',
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_context().dialect.name != 'postgresql':
+        return
+
+    op.drop_index('ix_todos_search', table_name='todos')
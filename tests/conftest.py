@@ -2,20 +2,49 @@ from contextlib import contextmanager
 from datetime import datetime
 
 import factory
+import factory.fuzzy
 import pytest
 import pytest_asyncio
+from docker.errors import DockerException
 from fastapi.testclient import TestClient
 from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.pool import StaticPool
+from testcontainers.postgres import PostgresContainer
 
 from fast_zero.app import app
 from fast_zero.database import get_session
-from fast_zero.models import User, table_registry
-from fast_zero.security import get_password_hash
+from fast_zero.models import Todo, TodoState, User, table_registry
+from fast_zero.querylog import QueryLog, watch_engine
+from fast_zero.security import get_password_hash, principal_cache
 from fast_zero.settings import Settings
 
 
+def pytest_addoption(parser):
+    parser.addoption(
+        '--benchmark',
+        action='store_true',
+        help='run wall-clock benchmarks as well',
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--benchmark'):
+        return
+
+    skip = pytest.mark.skip(reason='benchmark, run with --benchmark')
+    for item in items:
+        if 'benchmark' in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture(autouse=True)
+def clear_principal_cache():
+    principal_cache.clear()
+    yield
+    principal_cache.clear()
+
+
 @pytest.fixture
 def client(session):
     def get_session_override():
@@ -28,6 +57,18 @@ def client(session):
     app.dependency_overrides.clear()
 
 
+@pytest.fixture
+def pg_client(pg_session):
+    def get_session_override():
+        return pg_session
+
+    with TestClient(app) as client:
+        app.dependency_overrides[get_session] = get_session_override
+        yield client
+
+    app.dependency_overrides.clear()
+
+
 @pytest_asyncio.fixture
 async def session():
     engine = create_async_engine(
@@ -46,6 +87,35 @@ async def session():
         await conn.run_sync(table_registry.metadata.drop_all)
 
 
+@pytest.fixture(scope='session')
+def postgres_url():
+    try:
+        container = PostgresContainer('postgres:16', driver='psycopg')
+        container.start()
+    except DockerException as exc:
+        pytest.skip(f'PostgreSQL container unavailable: {exc}')
+
+    yield container.get_connection_url()
+
+    container.stop()
+
+
+@pytest_asyncio.fixture
+async def pg_session(postgres_url):
+    engine = create_async_engine(postgres_url)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(table_registry.metadata.create_all)
+
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        yield session
+
+    async with engine.begin() as conn:
+        await conn.run_sync(table_registry.metadata.drop_all)
+
+    await engine.dispose()
+
+
 @contextmanager
 def __mock__db_time(*, model, time=datetime(2025, 4, 17)):
     def fake_time_hook(mapper, connection, target):
@@ -66,6 +136,30 @@ def mock_db_time():
     return __mock__db_time
 
 
+@pytest.fixture
+def count_queries(session):
+    @contextmanager
+    def _count_queries():
+        with watch_engine(session.bind) as log:
+            yield log.statements
+
+    return _count_queries
+
+
+@pytest.fixture
+def max_queries(session):
+    @contextmanager
+    def _max_queries(limit, max_repeats=0):
+        log = QueryLog(max_statements=limit, max_repeats=max_repeats)
+        with watch_engine(session.bind, log):
+            yield log
+
+        problems = log.problems()
+        assert not problems, '\n'.join([*problems, *log.statements])
+
+    return _max_queries
+
+
 @pytest_asyncio.fixture
 async def user(session: AsyncSession):
     password = 'bananaphone'
@@ -106,6 +200,16 @@ class UserFactory(factory.Factory):
     password = factory.LazyAttribute(lambda obj: f'{obj.username}')
 
 
+class TodoFactory(factory.Factory):
+    class Meta:
+        model = Todo
+
+    title = factory.Faker('text')
+    description = factory.Faker('text')
+    state = factory.fuzzy.FuzzyChoice(TodoState)
+    user_id = 1
+
+
 @pytest_asyncio.fixture
 async def other_user(session: AsyncSession):
     password = 'test'
@@ -73,3 +73,13 @@ def test_token_expired_dont_refresh(client, user):
         )
         assert response.status_code == HTTPStatus.UNAUTHORIZED
         assert response.json() == {'detail': 'Could not validate credentials'}
+
+
+def test_get_token_statement_count(client, user, count_queries):
+    with count_queries() as statements:
+        client.post(
+            'auth/token',
+            data={'username': user.email, 'password': user.clean_password},
+        )
+
+    assert len(statements) == 1
@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from freezegun import freeze_time
+
+from fast_zero.cache import TTLCache
+
+
+def test_cache_evicts_least_recently_used():
+    principals = TTLCache(maxsize=2, ttl=60)
+    principals.set('a', 'alice')
+    principals.set('b', 'bob')
+    principals.get('a')
+
+    principals.set('c', 'carol')
+
+    assert principals.get('b') is None
+    assert principals.get('a') == 'alice'
+    assert principals.get('c') == 'carol'
+
+
+def test_cache_expires_entries():
+    principals = TTLCache(maxsize=2, ttl=60)
+
+    with freeze_time('2025-04-17 12:00:00') as frozen:
+        principals.set('a', 'alice')
+        frozen.tick(timedelta(seconds=61))
+
+        assert principals.get('a') is None
+
+    assert principals.misses.value == 1
+
+
+def test_disabled_cache_stores_nothing():
+    principals = TTLCache(maxsize=0, ttl=60)
+    principals.set('a', 'alice')
+
+    assert principals.get('a') is None
+    assert len(principals) == 0
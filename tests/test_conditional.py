@@ -0,0 +1,29 @@
+from http import HTTPStatus
+
+import pytest
+from fastapi import HTTPException, Response
+
+from fast_zero.conditional import (
+    parse_version_etag,
+    version_etag,
+    version_precondition,
+)
+
+
+@pytest.mark.parametrize('value', ['"7"', 'W/"7"', ' "7" '])
+def test_parse_version_etag(value):
+    assert parse_version_etag(value) == parse_version_etag(version_etag(7))
+
+
+def test_parse_invalid_version_etag():
+    with pytest.raises(HTTPException) as exc:
+        parse_version_etag('"abc"')
+
+    assert exc.value.status_code == HTTPStatus.PRECONDITION_FAILED
+
+
+@pytest.mark.parametrize('if_match', [None, '*'])
+def test_version_precondition_without_expected_version(if_match):
+    precondition = version_precondition(Response(), if_match)
+
+    assert precondition.expected is None
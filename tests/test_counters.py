@@ -0,0 +1,126 @@
+import json
+from http import HTTPStatus
+
+import pytest
+
+from fast_zero.counters import (
+    adjust_counters,
+    counter_drift,
+    read_counters,
+    rebuild_counters,
+    state_deltas,
+)
+from fast_zero.models import TodoState, User
+from tests.conftest import TodoFactory
+
+
+def test_todo_summary_without_todos(client, token):
+    response = client.get(
+        '/todos/summary', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {
+        'total': 0,
+        'states': {state.value: 0 for state in TodoState},
+    }
+
+
+@pytest.mark.asyncio
+async def test_counters_follow_every_write_path(session, client, user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    for state in ['todo', 'todo', 'doing']:
+        client.post(
+            '/todos/',
+            headers=headers,
+            json={'title': 't', 'description': 'd', 'state': state},
+        )
+    first, second, third = [
+        todo['id']
+        for todo in client.get('/todos/', headers=headers).json()['todos']
+    ]
+
+    client.patch(f'/todos/{first}', headers=headers, json={'state': 'done'})
+    client.patch(f'/todos/{second}', headers=headers, json={'title': 'x'})
+    client.delete(f'/todos/{third}', headers=headers)
+    client.post(
+        '/todos/batch',
+        headers=headers,
+        json={
+            'create': [{'title': 'b', 'description': 'b', 'state': 'trash'}],
+            'update': [{'id': second, 'state': 'draft'}],
+            'delete': [first],
+        },
+    )
+    client.post(
+        '/todos/import',
+        headers=headers,
+        content=json.dumps({'title': 'i', 'description': 'i'}).encode(),
+    )
+
+    summary = client.get('/todos/summary', headers=headers).json()
+
+    assert summary['states'] == {
+        'draft': 2,
+        'todo': 0,
+        'doing': 0,
+        'done': 0,
+        'trash': 1,
+    }
+    assert summary['total'] == sum(summary['states'].values())
+    assert await counter_drift(session, user.id) == {}
+
+
+@pytest.mark.asyncio
+async def test_rebuild_counters_repairs_drift(session, user, other_user):
+    session.add_all(TodoFactory.create_batch(2, user_id=user.id, state='done'))
+    session.add(TodoFactory(user_id=other_user.id, state='todo'))
+    await session.commit()
+    await adjust_counters(
+        session, user.id, state_deltas(added=[TodoState.draft])
+    )
+    await session.commit()
+
+    drift = await counter_drift(session, user.id)
+    await rebuild_counters(session)
+
+    assert drift == {TodoState.draft: (1, 0), TodoState.done: (0, 2)}
+    assert await counter_drift(session, user.id) == {}
+    assert await counter_drift(session, other_user.id) == {}
+
+
+@pytest.mark.asyncio
+async def test_rebuild_counters_for_one_user(session, user, other_user):
+    session.add(TodoFactory(user_id=user.id, state='done'))
+    session.add(TodoFactory(user_id=other_user.id, state='todo'))
+    await session.commit()
+
+    await rebuild_counters(session, user.id)
+
+    assert await counter_drift(session, user.id) == {}
+    assert await counter_drift(session, other_user.id) == {
+        TodoState.todo: (0, 1)
+    }
+
+
+@pytest.mark.asyncio
+async def test_adjust_counters_upserts_on_postgres(pg_session):
+    user = User(username='counter', email='counter@test.com', password='x')
+    pg_session.add(user)
+    await pg_session.commit()
+
+    await adjust_counters(
+        pg_session,
+        user.id,
+        state_deltas(added=[TodoState.todo, TodoState.todo]),
+    )
+    await adjust_counters(
+        pg_session,
+        user.id,
+        state_deltas(added=[TodoState.done], removed=[TodoState.todo]),
+    )
+    await pg_session.commit()
+
+    counters = await read_counters(pg_session, user.id)
+    assert counters[TodoState.todo] == 1
+    assert counters[TodoState.done] == 1
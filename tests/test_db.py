@@ -1,10 +1,13 @@
 from dataclasses import asdict
 
 import pytest
-from sqlalchemy import select
+from sqlalchemy import select, text, tuple_
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import InvalidRequestError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
-from fast_zero.models import User
+from fast_zero.models import Todo, TodoState, User
 
 
 @pytest.mark.asyncio
@@ -16,7 +19,11 @@ async def test_create_user(session: AsyncSession, mock_db_time):
         session.add(user)
         await session.commit()
 
-    user = await session.scalar(select(User).where(User.username == 'alice'))
+    user = await session.scalar(
+        select(User)
+        .options(selectinload(User.todos))
+        .where(User.username == 'alice')
+    )
     assert asdict(user) == {
         'username': 'alice',
         'email': 'teste@teste.com',
@@ -26,3 +33,79 @@ async def test_create_user(session: AsyncSession, mock_db_time):
         'updated_at': time,
         'todos': [],
     }
+
+
+@pytest.mark.asyncio
+async def test_user_todos_are_not_loaded_implicitly(session, user):
+    session.expunge_all()
+
+    db_user = await session.scalar(select(User).where(User.id == user.id))
+
+    with pytest.raises(InvalidRequestError):
+        len(db_user.todos)
+
+
+async def _seed_and_explain(session, query):
+    users = [
+        User(username=f'u{n}', email=f'u{n}@test.com', password='x')
+        for n in range(50)
+    ]
+    session.add_all(users)
+    await session.flush()
+    session.add_all(
+        Todo(title='t', description='d', state=state, user_id=user.id)
+        for user in users
+        for state in TodoState
+        for _ in range(40)
+    )
+    await session.commit()
+    await session.execute(text('ANALYZE todos'))
+
+    compiled = query.compile(
+        dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True}
+    )
+    plan = await session.scalars(text(f'EXPLAIN {compiled}'))
+    return '\n'.join(plan.all())
+
+
+@pytest.mark.asyncio
+async def test_list_todos_by_user_uses_index(pg_session):
+    query = select(Todo).where(Todo.user_id == 1).order_by(Todo.id).limit(100)
+
+    plan = await _seed_and_explain(pg_session, query)
+
+    assert 'Seq Scan' not in plan
+    assert 'ix_todos_user_id_id' in plan
+
+
+@pytest.mark.asyncio
+async def test_list_todos_by_user_and_state_uses_index(pg_session):
+    query = (
+        select(Todo)
+        .where(Todo.user_id == 1, Todo.state == TodoState.done)
+        .order_by(Todo.id)
+        .limit(100)
+    )
+
+    plan = await _seed_and_explain(pg_session, query)
+
+    assert 'Seq Scan' not in plan
+    assert 'ix_todos_user_id_state_id' in plan
+
+
+@pytest.mark.asyncio
+async def test_sync_todos_by_user_uses_change_seq_index(pg_session):
+    query = (
+        select(Todo)
+        .where(
+            Todo.user_id == 1,
+            tuple_(Todo.change_seq, Todo.id) > (1000, 0),
+        )
+        .order_by(Todo.change_seq, Todo.id)
+        .limit(100)
+    )
+
+    plan = await _seed_and_explain(pg_session, query)
+
+    assert 'Seq Scan' not in plan
+    assert 'ix_todos_user_id_change_seq_id' in plan
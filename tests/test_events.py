@@ -0,0 +1,254 @@
+import asyncio
+import json
+import tracemalloc
+
+import psycopg
+import pytest
+from sqlalchemy import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from fast_zero import events as events_module
+from fast_zero.events import Broker, MemoryBackend, PostgresBackend, broker
+from fast_zero.metrics import event_metrics
+from fast_zero.routers.todos import todo_events
+from fast_zero.security import Principal
+
+
+@pytest.mark.asyncio
+async def test_broker_delivers_only_to_the_user(session):
+    events = Broker(MemoryBackend(), buffer_size=10)
+    alice = await events.subscribe(1)
+    bob = await events.subscribe(2)
+
+    await events.publish(session, 1, [('todo.deleted', {'id': 7})])
+    await session.commit()
+
+    frame = await anext(events.stream(alice, keepalive=1))
+    assert frame == 'event: todo.deleted\ndata: {"id":7}\n\n'
+    assert bob.queue.empty()
+
+
+@pytest.mark.asyncio
+async def test_broker_delivers_only_committed_events(session):
+    events = Broker(MemoryBackend(), buffer_size=10)
+    subscription = await events.subscribe(1)
+
+    await events.publish(session, 1, [('todo.deleted', {'id': 1})])
+    pending = subscription.queue.qsize()
+    await session.rollback()
+    await events.publish(session, 1, [('todo.deleted', {'id': 2})])
+    await session.commit()
+
+    frame = await anext(events.stream(subscription, keepalive=1))
+    assert pending == 0
+    assert frame == 'event: todo.deleted\ndata: {"id":2}\n\n'
+    assert subscription.queue.empty()
+
+
+@pytest.mark.asyncio
+async def test_broker_sends_keepalive_when_idle():
+    events = Broker(MemoryBackend(), buffer_size=10)
+    subscription = await events.subscribe(1)
+
+    frame = await anext(events.stream(subscription, keepalive=0.01))
+
+    assert frame == ': keepalive\n\n'
+
+
+@pytest.mark.asyncio
+async def test_broker_disconnects_slow_consumer(session):
+    events = Broker(MemoryBackend(), buffer_size=2)
+    subscription = await events.subscribe(1)
+    dropped = event_metrics.slow_consumers.value
+
+    await events.publish(
+        session,
+        1,
+        [('todo.deleted', {'id': todo_id}) for todo_id in range(3)],
+    )
+    await session.commit()
+
+    frames = [frame async for frame in events.stream(subscription, 1)]
+
+    assert frames == []
+    assert len(events) == 0
+    assert event_metrics.slow_consumers.value == dropped + 1
+
+
+class FlakyBackend(MemoryBackend):
+    def __init__(self):
+        super().__init__()
+        self.attempts = 0
+
+    async def start(self, dispatch, disconnected):
+        self.attempts += 1
+        if self.attempts == 1:
+            raise OSError('database is restarting')
+        await super().start(dispatch, disconnected)
+
+
+@pytest.mark.asyncio
+async def test_broker_retries_start_after_backend_failure(session):
+    backend = FlakyBackend()
+    events = Broker(backend, buffer_size=10)
+
+    with pytest.raises(OSError, match='restarting'):
+        await events.subscribe(1)
+    subscription = await events.subscribe(1)
+    await events.publish(session, 1, [('todo.deleted', {'id': 2})])
+    await session.commit()
+
+    frame = await anext(events.stream(subscription, keepalive=1))
+    expected_attempts = 2
+    assert backend.attempts == expected_attempts
+    assert frame == 'event: todo.deleted\ndata: {"id":2}\n\n'
+
+
+@pytest.mark.asyncio
+async def test_broker_holds_idle_subscribers_in_bounded_memory(session):
+    subscribers = 2000
+    max_bytes_per_subscriber = 16 * 1024
+    events = Broker(MemoryBackend(), buffer_size=100)
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    subscriptions = [await events.subscribe(n) for n in range(subscribers)]
+    consumers = [
+        asyncio.create_task(anext(events.stream(subscription, keepalive=60)))
+        for subscription in subscriptions
+    ]
+    await asyncio.sleep(0)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    held = len(events)
+
+    await events.publish(session, 0, [('todo.deleted', {'id': 1})])
+    await session.commit()
+    frame = await asyncio.wait_for(consumers[0], timeout=5)
+    for consumer in consumers[1:]:
+        consumer.cancel()
+    await asyncio.gather(*consumers[1:], return_exceptions=True)
+
+    assert (after - before) / subscribers < max_bytes_per_subscriber
+    assert frame.startswith('event: todo.deleted')
+    assert held == subscribers
+
+
+@pytest.mark.asyncio
+async def test_todo_events_streams_committed_changes(user, client, token):
+    principal = Principal(id=user.id, email=user.email, username=user.username)
+    response = await todo_events(principal)
+    first_frame = asyncio.create_task(anext(response.body_iterator))
+    while not len(broker):
+        await asyncio.sleep(0)
+
+    client.post(
+        '/todos/',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'title': 'sse', 'description': 'sse', 'state': 'todo'},
+    )
+    frame = await asyncio.wait_for(first_frame, timeout=5)
+    await response.body_iterator.aclose()
+
+    event, data = frame.strip().split('\n')
+    assert response.media_type == 'text/event-stream'
+    assert event == 'event: todo.created'
+    assert json.loads(data.removeprefix('data: '))['title'] == 'sse'
+    assert len(broker) == 0
+
+
+@pytest.mark.asyncio
+async def test_todo_events_subscribe_only_once_streaming(user):
+    principal = Principal(id=user.id, email=user.email, username=user.username)
+
+    response = await todo_events(principal)
+
+    assert len(broker) == 0
+    await response.body_iterator.aclose()
+    assert len(broker) == 0
+
+
+async def _notify(postgres_url, user_id, todo_id):
+    publisher = Broker(PostgresBackend(postgres_url), buffer_size=10)
+    engine = create_async_engine(postgres_url)
+    async with AsyncSession(engine) as session:
+        await publisher.publish(
+            session, user_id, [('todo.deleted', {'id': todo_id})]
+        )
+        await session.commit()
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_postgres_backend_fans_out_across_brokers(postgres_url):
+    listener = Broker(PostgresBackend(postgres_url), buffer_size=10)
+    subscription = await listener.subscribe(1)
+
+    await _notify(postgres_url, 1, 3)
+    frame = await asyncio.wait_for(
+        anext(listener.stream(subscription, keepalive=5)), timeout=5
+    )
+
+    await listener.close()
+    assert frame == 'event: todo.deleted\ndata: {"id":3}\n\n'
+
+
+def _conninfo(postgres_url):
+    url = make_url(postgres_url).set(drivername='postgresql')
+    return url.render_as_string(hide_password=False)
+
+
+@pytest.mark.asyncio
+async def test_postgres_backend_survives_a_bad_payload(postgres_url):
+    listener = Broker(PostgresBackend(postgres_url), buffer_size=10)
+    subscription = await listener.subscribe(1)
+
+    async with await psycopg.AsyncConnection.connect(
+        _conninfo(postgres_url), autocommit=True
+    ) as connection:
+        await connection.execute("SELECT pg_notify('todo_events', 'not json')")
+    await _notify(postgres_url, 1, 4)
+    frame = await asyncio.wait_for(
+        anext(listener.stream(subscription, keepalive=5)), timeout=5
+    )
+
+    await listener.close()
+    assert frame == 'event: todo.deleted\ndata: {"id":4}\n\n'
+
+
+@pytest.mark.asyncio
+async def test_postgres_backend_reconnects_and_ends_streams(
+    postgres_url, monkeypatch
+):
+    monkeypatch.setattr(events_module, 'RECONNECT_DELAY', 0.01)
+    listener = Broker(PostgresBackend(postgres_url), buffer_size=10)
+    subscription = await listener.subscribe(1)
+
+    async with await psycopg.AsyncConnection.connect(
+        _conninfo(postgres_url), autocommit=True
+    ) as connection:
+        await connection.execute(
+            'SELECT pg_terminate_backend(pid) FROM pg_stat_activity'
+            " WHERE query = 'LISTEN todo_events'"
+        )
+    frames = await asyncio.wait_for(
+        _collect(listener.stream(subscription, keepalive=5)), timeout=5
+    )
+
+    resubscribed = await listener.subscribe(1)
+    frame = None
+    for _ in range(50):
+        await _notify(postgres_url, 1, 5)
+        try:
+            frame = await asyncio.wait_for(resubscribed.queue.get(), 0.1)
+            break
+        except TimeoutError:
+            continue
+
+    await listener.close()
+    assert frames == []
+    assert frame == 'event: todo.deleted\ndata: {"id":5}\n\n'
+
+
+async def _collect(stream):
+    return [frame async for frame in stream]
@@ -0,0 +1,107 @@
+import time
+from http import HTTPStatus
+
+import pytest
+
+from fast_zero.database import instrument_engine
+from fast_zero.metrics import Histogram, http_metrics, render_metrics
+from fast_zero.middleware import MetricsMiddleware
+
+
+def test_histogram_buckets_are_cumulative():
+    route = http_metrics.routes['GET', '/histogram']
+    route.latency = Histogram((0.1, 1))
+    for value in [0.05, 0.1, 0.5, 3]:
+        route.latency.observe(value)
+
+    lines = [
+        line
+        for line in render_metrics({}).splitlines()
+        if line.startswith('fast_zero_http_request_duration_seconds_')
+        and '/histogram' in line
+    ]
+    del http_metrics.routes['GET', '/histogram']
+
+    labels = 'method="GET",route="/histogram"'
+    assert [line.split('_seconds_')[1] for line in lines] == [
+        f'bucket{{{labels},le="0.1"}} 2',
+        f'bucket{{{labels},le="1"}} 3',
+        f'bucket{{{labels},le="+Inf"}} 4',
+        f'sum{{{labels}}} 3.65',
+        f'count{{{labels}}} 4',
+    ]
+
+
+def test_render_metrics_escapes_labels_and_includes_pool():
+    http_metrics.routes['GET', '/a"b'].responses[200].inc()
+
+    text = render_metrics({'size': 5, 'checked_out': 1})
+
+    assert 'fast_zero_http_requests_total{method="GET",route="/a\\"b"' in text
+    assert 'fast_zero_db_pool_size 5' in text
+    assert 'fast_zero_db_pool_checked_out 1' in text
+    assert '# TYPE fast_zero_http_request_duration_seconds histogram' in text
+    del http_metrics.routes['GET', '/a"b']
+
+
+@pytest.mark.asyncio
+async def test_middleware_records_route_status_and_statements(
+    session, client, user, token
+):
+    instrument_engine(session.bind)
+    route = http_metrics.routes['GET', '/todos/']
+    requests, statements = route.latency.count, route.statements.total
+
+    client.get('/todos/', headers={'Authorization': f'Bearer {token}'})
+
+    assert route.latency.count == requests + 1
+    assert route.statements.total > statements
+    assert route.db_time.count == requests + 1
+    assert route.responses[HTTPStatus.OK].value >= 1
+
+
+def test_middleware_groups_unmatched_paths(client):
+    client.get('/nowhere/at/all')
+
+    responses = http_metrics.routes['GET', 'unmatched'].responses
+    assert responses[HTTPStatus.NOT_FOUND].value >= 1
+
+
+def test_metrics_endpoint(client):
+    client.get('/')
+
+    response = client.get('/metrics')
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['content-type'].startswith('text/plain')
+    assert (
+        'fast_zero_http_requests_total{method="GET",route="/",status="200"}'
+        in response.text
+    )
+    assert 'fast_zero_password_hash_seconds_count' in response.text
+
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+async def test_middleware_overhead_is_a_few_microseconds():
+    requests = 20_000
+    max_overhead = 25e-6
+
+    async def app(scope, receive, send):
+        await send({'type': 'http.response.start', 'status': 200})
+
+    async def send(message):
+        pass
+
+    async def per_request(target):
+        scope = {'type': 'http', 'method': 'GET'}
+        started = time.perf_counter()
+        for _ in range(requests):
+            await target(scope, None, send)
+        return (time.perf_counter() - started) / requests
+
+    bare = await per_request(app)
+    wrapped = await per_request(MetricsMiddleware(app))
+    del http_metrics.routes['GET', 'unmatched']
+
+    assert wrapped - bare < max_overhead
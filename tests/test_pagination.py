@@ -0,0 +1,70 @@
+from http import HTTPStatus
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+
+from fast_zero.models import Todo, User
+from fast_zero.pagination import (
+    decode_cursor,
+    encode_cursor,
+    estimate_count,
+    paginate,
+)
+from fast_zero.schemas import FilterPage
+
+
+def test_cursor_roundtrip():
+    last_id = 42
+    assert decode_cursor(encode_cursor(last_id)) == last_id
+
+
+@pytest.mark.parametrize('cursor', ['', 'not-a-cursor', encode_cursor('1')])
+def test_decode_invalid_cursor(cursor):
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(cursor)
+
+    assert exc.value.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_paginate_with_cursor_uses_keyset_instead_of_offset():
+    page = FilterPage(cursor=encode_cursor(1000000), limit=10)
+
+    query = paginate(select(Todo), Todo.id, page)
+    sql = str(query.compile(dialect=postgresql.dialect()))
+
+    assert 'OFFSET' not in sql
+    assert 'WHERE todos.id > %(id_1)s' in sql
+    assert 'ORDER BY todos.id' in sql
+
+
+def test_paginate_without_cursor_keeps_offset():
+    page = FilterPage(offset=20, limit=10)
+
+    query = paginate(select(Todo), Todo.id, page)
+    sql = str(query.compile(dialect=postgresql.dialect()))
+
+    assert 'OFFSET' in sql
+    assert 'ORDER BY todos.id' in sql
+
+
+@pytest.mark.asyncio
+async def test_estimate_count_reads_planner_statistics(pg_session):
+    rows = 1000
+    user = User(username='estimate', email='estimate@test.com', password='x')
+    pg_session.add(user)
+    await pg_session.flush()
+    pg_session.add_all(
+        Todo(title='t', description='d', state='todo', user_id=user.id)
+        for _ in range(rows)
+    )
+    await pg_session.commit()
+    await pg_session.execute(text('ANALYZE todos'))
+
+    estimate = await estimate_count(
+        pg_session, select(Todo.id).where(Todo.title.contains('t%'))
+    )
+
+    assert 0 < estimate <= rows
+    assert await estimate_count(pg_session, select(Todo.id)) == rows
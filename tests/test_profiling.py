@@ -0,0 +1,180 @@
+import asyncio
+import pstats
+from http import HTTPStatus
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from fast_zero.app import app
+from fast_zero.middleware import ProfileStore, ProfilingMiddleware
+from fast_zero.routers import profiles
+from fast_zero.settings import Settings
+
+
+@pytest.fixture
+def profiling_settings(tmp_path):
+    return Settings(
+        PROFILING_ENABLED=True,
+        PROFILING_TOKEN='profile-me',
+        PROFILING_DIR=str(tmp_path),
+        PROFILING_MAX_FILES=2,
+    )
+
+
+@pytest.fixture
+def profiled_client(client, profiling_settings):
+    return TestClient(ProfilingMiddleware(app, profiling_settings))
+
+
+def test_profiling_is_left_out_when_disabled():
+    assert not Settings().PROFILING_ENABLED
+    assert all(
+        middleware.cls is not ProfilingMiddleware
+        for middleware in app.user_middleware
+    )
+    assert not any(route.path.startswith('/profiles') for route in app.routes)
+
+
+def test_profile_ring_needs_at_least_one_file():
+    with pytest.raises(ValidationError, match='PROFILING_MAX_FILES'):
+        Settings(PROFILING_MAX_FILES=0)
+
+
+def test_authorized_request_is_profiled(profiled_client, token, tmp_path):
+    response = profiled_client.get(
+        '/todos/',
+        headers={
+            'Authorization': f'Bearer {token}',
+            'X-Profile-Token': 'profile-me',
+        },
+    )
+
+    profile_id = response.headers['x-profile-id']
+    stats = pstats.Stats(str(tmp_path / f'{profile_id}.prof'))
+    functions = {name for _, _, name in stats.stats}
+    assert response.status_code == HTTPStatus.OK
+    assert {
+        'solve_dependencies',
+        'get_current_user',
+        'list_todos',
+        'serialize_response',
+        'do_execute',
+    } <= functions
+
+
+@pytest.mark.parametrize('headers', [{}, {'X-Profile-Token': 'guess'}])
+def test_other_requests_are_not_profiled(profiled_client, tmp_path, headers):
+    response = profiled_client.get('/', headers=headers)
+
+    assert 'x-profile-id' not in response.headers
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_sampled_requests_are_profiled(client, profiling_settings):
+    profiling_settings.PROFILING_TOKEN = ''
+    profiling_settings.PROFILING_SAMPLE_RATE = 1.0
+    sampled = TestClient(ProfilingMiddleware(app, profiling_settings))
+
+    response = sampled.get('/')
+
+    assert 'x-profile-id' in response.headers
+
+
+def test_profile_ring_keeps_the_newest_files(profiled_client, tmp_path):
+    ids = [
+        profiled_client.get(
+            '/', headers={'X-Profile-Token': 'profile-me'}
+        ).headers['x-profile-id']
+        for _ in range(3)
+    ]
+
+    assert sorted(path.stem for path in tmp_path.iterdir()) == ids[1:]
+
+
+def test_download_profile(profiled_client, profiling_settings, monkeypatch):
+    monkeypatch.setattr(profiles, 'settings', profiling_settings)
+    monkeypatch.setattr(
+        profiles, 'store', ProfileStore(profiling_settings.PROFILING_DIR, 2)
+    )
+    downloads = FastAPI()
+    downloads.include_router(profiles.router)
+    headers = {'X-Profile-Token': 'profile-me'}
+    profile_id = profiled_client.get('/', headers=headers).headers[
+        'x-profile-id'
+    ]
+
+    with TestClient(downloads) as client:
+        response = client.get(f'/profiles/{profile_id}', headers=headers)
+        forbidden = client.get(f'/profiles/{profile_id}')
+        missing = client.get('/profiles/..%2Fsettings', headers=headers)
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['content-type'] == 'application/octet-stream'
+    assert forbidden.status_code == HTTPStatus.FORBIDDEN
+    assert missing.status_code == HTTPStatus.NOT_FOUND
+
+
+class SlowApp:
+    def __init__(self):
+        self.log = []
+        self.release = asyncio.Event()
+
+    async def __call__(self, scope, receive, send):
+        name = scope['path'].strip('/')
+        self.log.append(f'{name} start')
+        if name == 'slow':
+            await self.release.wait()
+        else:
+            await asyncio.sleep(0.01)
+        self.log.append(f'{name} end')
+        await send({'type': 'http.response.start', 'status': 200})
+
+
+def _request(middleware, path, headers=()):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'headers': headers}
+    return asyncio.create_task(middleware(scope, None, send)), messages
+
+
+@pytest.mark.asyncio
+async def test_profiled_request_does_not_hold_back_others(
+    profiling_settings, tmp_path
+):
+    app = SlowApp()
+    middleware = ProfilingMiddleware(app, profiling_settings)
+
+    slow, _ = _request(middleware, '/slow')
+    await asyncio.sleep(0)
+    profiled, messages = _request(
+        middleware, '/profiled', [(b'x-profile-token', b'profile-me')]
+    )
+    await asyncio.sleep(0)
+    late, _ = _request(middleware, '/late')
+    await asyncio.wait_for(asyncio.gather(profiled, late), timeout=1)
+    app.release.set()
+    await slow
+
+    headers = dict(messages[0]['headers'])
+    assert app.log.index('late end') < app.log.index('slow end')
+    assert headers[b'x-profile-concurrent-requests'] == b'2'
+    assert (tmp_path / f'{headers[b"x-profile-id"].decode()}.prof').exists()
+
+
+@pytest.mark.asyncio
+async def test_profile_alone_is_not_flagged(profiling_settings):
+    middleware = ProfilingMiddleware(SlowApp(), profiling_settings)
+
+    profiled, messages = _request(
+        middleware, '/profiled', [(b'x-profile-token', b'profile-me')]
+    )
+    await profiled
+
+    headers = dict(messages[0]['headers'])
+    assert b'x-profile-id' in headers
+    assert b'x-profile-concurrent-requests' not in headers
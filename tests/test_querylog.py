@@ -0,0 +1,104 @@
+import logging
+
+import pytest
+from sqlalchemy import select
+
+from fast_zero.database import create_query_log, instrument_engine, query_log
+from fast_zero.models import Todo, User
+from fast_zero.querylog import QueryLog, redact, statement_shape, watch_engine
+
+
+def test_statement_shape_folds_in_lists_and_whitespace():
+    short = 'SELECT id FROM todos\n WHERE id IN (?, ?)'
+    long = 'SELECT id FROM todos WHERE id IN (?, ?, ?, ?)'
+    named = 'SELECT id FROM todos WHERE id IN (%(id_1_1)s, %(id_1_2)s)'
+
+    assert statement_shape(short) == 'SELECT id FROM todos WHERE id IN (...)'
+    assert statement_shape(short) == statement_shape(long)
+    assert statement_shape(named) == statement_shape(long)
+
+
+def test_redact_keeps_only_parameter_types():
+    assert redact({'email': 'a@b.c', 'id': 1}) == {
+        'email': '<str>',
+        'id': '<int>',
+    }
+    assert redact(('secret', None)) == ('<str>', '<null>')
+    assert redact([(1,), (2,)], executemany=True) == '<2 parameter sets>'
+
+
+def test_query_log_flags_statement_budget_and_repeats():
+    log = QueryLog(max_statements=3, max_repeats=2)
+    for todo_id in range(3):
+        log.record('SELECT * FROM todos WHERE id = ?', (todo_id,), 0.0)
+    log.record('SELECT * FROM users', (), 0.0)
+
+    assert log.problems() == [
+        '4 statements exceed the limit of 3',
+        'Possible N+1: 3 executions of SELECT * FROM todos WHERE id = ?',
+    ]
+
+
+@pytest.mark.asyncio
+async def test_slow_queries_are_logged_without_values(session, user, caplog):
+    log = QueryLog(slow_threshold=1e-9)
+
+    with caplog.at_level(logging.WARNING, logger='fast_zero.querylog'):
+        with watch_engine(session.bind, log):
+            await session.scalar(select(User).where(User.email == user.email))
+
+    assert 'Slow query' in caplog.text
+    assert "'<str>'" in caplog.text
+    assert user.email not in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_request_log_detects_n_plus_one(session, user, caplog):
+    instrument_engine(session.bind)
+    log = QueryLog(max_repeats=2)
+    token = query_log.set(log)
+
+    for todo_id in range(3):
+        await session.scalar(select(Todo).where(Todo.id == todo_id))
+    query_log.reset(token)
+    await session.scalar(select(Todo))
+
+    with caplog.at_level(logging.WARNING, logger='fast_zero.querylog'):
+        log.report('GET /todos/')
+
+    expected_statements = 3
+    assert len(log) == expected_statements
+    assert 'GET /todos/: Possible N+1: 3 executions of SELECT' in caplog.text
+
+
+def test_create_query_log_reads_settings(settings):
+    log = create_query_log(settings)
+
+    assert log.slow_threshold == settings.QUERY_SLOW_THRESHOLD
+    assert log.max_statements == settings.QUERY_MAX_STATEMENTS
+    assert log.max_repeats == settings.QUERY_MAX_REPEATS
+
+
+def test_max_queries_fails_over_budget(client, token, max_queries):
+    with pytest.raises(AssertionError, match='exceed the limit of 1'):
+        with max_queries(1):
+            client.get('/users/', headers={'Authorization': f'Bearer {token}'})
+
+
+@pytest.mark.parametrize(
+    ('path', 'limit'),
+    [
+        ('/todos/', 3),
+        ('/todos/summary', 2),
+        ('/todos/sync', 4),
+        ('/users/', 2),
+        ('/users/1', 2),
+    ],
+)
+def test_endpoint_query_budgets(client, token, max_queries, path, limit):
+    with max_queries(limit, max_repeats=1):
+        response = client.get(
+            path, headers={'Authorization': f'Bearer {token}'}
+        )
+
+    assert response.is_success
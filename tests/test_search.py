@@ -0,0 +1,84 @@
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+
+from fast_zero.models import Todo, TodoState, User
+from fast_zero.search import search_todos
+
+
+@pytest.mark.asyncio
+async def test_search_todos_on_sqlite_falls_back_to_like(session, user):
+    session.add_all([
+        Todo(
+            title='comprar pão',
+            description='padaria',
+            state=TodoState.todo,
+            user_id=user.id,
+        ),
+        Todo(
+            title='estudar',
+            description='comprar livro',
+            state=TodoState.todo,
+            user_id=user.id,
+        ),
+        Todo(
+            title='dormir',
+            description='cedo',
+            state=TodoState.todo,
+            user_id=user.id,
+        ),
+    ])
+    await session.commit()
+
+    todos = await session.scalars(
+        search_todos(select(Todo), 'comprar', 'sqlite').order_by(Todo.id)
+    )
+
+    assert [todo.title for todo in todos] == ['comprar pão', 'estudar']
+
+
+@pytest.mark.asyncio
+async def test_search_todos_on_postgres_ranks_by_relevance(pg_session):
+    user = User(username='alice', email='alice@test.com', password='x')
+    pg_session.add(user)
+    await pg_session.flush()
+    pg_session.add_all([
+        Todo(
+            title='livro',
+            description='comprar um livro',
+            state=TodoState.todo,
+            user_id=user.id,
+        ),
+        Todo(
+            title='dormir',
+            description='cedo',
+            state=TodoState.todo,
+            user_id=user.id,
+        ),
+        Todo(
+            title='livro livro',
+            description='ler o livro',
+            state=TodoState.todo,
+            user_id=user.id,
+        ),
+    ])
+    await pg_session.commit()
+
+    todos = await pg_session.scalars(
+        search_todos(select(Todo), 'livro', 'postgresql')
+    )
+
+    assert [todo.title for todo in todos] == ['livro livro', 'livro']
+
+
+@pytest.mark.asyncio
+async def test_search_todos_on_postgres_uses_gin_index(pg_session):
+    await pg_session.execute(text('SET LOCAL enable_seqscan = off'))
+    query = search_todos(select(Todo), 'livro', 'postgresql')
+    compiled = query.compile(
+        dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True}
+    )
+
+    plan = await pg_session.scalars(text(f'EXPLAIN {compiled}'))
+
+    assert 'ix_todos_search' in '\n'.join(plan.all())
@@ -1,8 +1,19 @@
 from http import HTTPStatus
 
+import pytest
 from jwt import decode
+from pydantic import ValidationError
 
-from fast_zero.security import create_access_token
+from fast_zero import security
+from fast_zero.metrics import password_hash_metrics
+from fast_zero.security import (
+    Principal,
+    create_access_token,
+    get_password_hash_async,
+    principal_cache,
+    verify_password_async,
+)
+from fast_zero.settings import Settings
 
 
 def test_jwt(settings):
@@ -21,3 +32,111 @@ def test_jwt_invalid_token(client):
 
     assert response.status_code == HTTPStatus.UNAUTHORIZED
     assert response.json() == {'detail': 'Could not validate credentials'}
+
+
+@pytest.mark.asyncio
+async def test_password_hash_async_roundtrip():
+    hashed = await get_password_hash_async('secret')
+
+    assert await verify_password_async('secret', hashed)
+    assert not await verify_password_async('wrong', hashed)
+
+
+@pytest.mark.asyncio
+async def test_password_hash_async_records_metrics():
+    hashed_before = password_hash_metrics.hash_time.count
+    waited_before = password_hash_metrics.queue_wait.count
+
+    await get_password_hash_async('secret')
+
+    assert password_hash_metrics.hash_time.count == hashed_before + 1
+    assert password_hash_metrics.queue_wait.count == waited_before + 1
+    assert password_hash_metrics.in_flight.value == 0
+
+
+def test_password_hash_pool_needs_a_worker():
+    with pytest.raises(ValidationError, match='PASSWORD_HASH_WORKERS'):
+        Settings(PASSWORD_HASH_WORKERS=0)
+
+
+def test_password_hash_pool_full_returns_503(client, monkeypatch):
+    monkeypatch.setattr(security.settings, 'PASSWORD_HASH_MAX_QUEUE', 0)
+    monkeypatch.setattr(
+        password_hash_metrics.in_flight,
+        'value',
+        security.settings.PASSWORD_HASH_WORKERS,
+    )
+    rejected_before = password_hash_metrics.rejected.value
+
+    response = client.post(
+        '/users/',
+        json={
+            'username': 'alice',
+            'email': 'alice@example.com',
+            'password': 'secret',
+        },
+    )
+
+    assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert response.json() == {'detail': 'Server busy, try again later'}
+    assert password_hash_metrics.rejected.value == rejected_before + 1
+
+
+def test_current_user_is_cached(client, user, token, count_queries):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.get('/users/', headers=headers)
+    hits_before = principal_cache.hits.value
+
+    with count_queries() as statements:
+        response = client.get('/users/', headers=headers)
+
+    assert response.status_code == HTTPStatus.OK
+    assert len(statements) == 1
+    assert principal_cache.hits.value == hits_before + 1
+    assert principal_cache.get(user.email) == Principal(
+        id=user.id, email=user.email, username=user.username
+    )
+
+
+def test_current_user_cache_can_be_disabled(
+    client, user, token, count_queries, monkeypatch
+):
+    monkeypatch.setattr(principal_cache, 'maxsize', 0)
+    headers = {'Authorization': f'Bearer {token}'}
+    expected_statements = 2
+    client.get('/users/', headers=headers)
+
+    with count_queries() as statements:
+        client.get('/users/', headers=headers)
+
+    assert len(statements) == expected_statements
+    assert len(principal_cache) == 0
+
+
+def test_current_user_cache_invalidated_on_update(client, user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.get('/users/', headers=headers)
+
+    client.put(
+        f'/users/{user.id}',
+        json={
+            'username': 'Gabriel',
+            'email': 'gabriel@example.com',
+            'password': 'lotr',
+        },
+        headers=headers,
+    )
+    response = client.get('/users/', headers=headers)
+
+    assert principal_cache.get('emerson@example.com') is None
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_current_user_cache_invalidated_on_delete(client, user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.get('/users/', headers=headers)
+
+    client.delete(f'/users/{user.id}', headers=headers)
+    response = client.get('/users/', headers=headers)
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
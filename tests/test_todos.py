@@ -1,20 +1,22 @@
+import asyncio
+import csv
+import io
+import json
+import math
 from http import HTTPStatus
 
-import factory
-import factory.fuzzy
 import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from fast_zero.models import Todo, TodoState
-
-
-class TodoFactory(factory.Factory):
-    class Meta:
-        model = Todo
-
-    title = factory.Faker('text')
-    description = factory.Faker('text')
-    state = factory.fuzzy.FuzzyChoice(TodoState)
-    user_id = 1
+from fast_zero.counters import counter_drift, next_change
+from fast_zero.models import Todo, TodoState, User
+from fast_zero.querylog import watch_engine
+from fast_zero.routers import todos
+from fast_zero.schemas import FilterSync
+from fast_zero.security import Principal, get_password_hash
+from fast_zero.transfer import export_todos, import_todos, read_todos
+from tests.conftest import TodoFactory
 
 
 @pytest.mark.asyncio
@@ -25,6 +27,7 @@ async def test_create_todo(client, token, mock_db_time):
             '/todos/', headers={'Authorization': f'Bearer {token}'}, json=data
         )
     data['id'] = 1
+    data['version'] = 1
     data['created_at'] = time.isoformat()
     data['updated_at'] = time.isoformat()
     assert response.status_code == HTTPStatus.CREATED
@@ -172,6 +175,7 @@ async def test_patch_todo(session, client, user, token):
     )
 
     data['id'] = todo.id
+    data['version'] = 2
     data['created_at'] = response.json()['created_at']
     data['updated_at'] = response.json()['updated_at']
 
@@ -190,3 +194,908 @@ async def test_patch_todo_error(session, client, user, token):
 
     assert response.status_code == HTTPStatus.NOT_FOUND
     assert response.json() == {'detail': 'Todo not found'}
+
+
+@pytest.mark.asyncio
+async def test_list_todos_statement_count(
+    session, client, user, token, count_queries
+):
+    expected_statements = 3
+    session.add_all(TodoFactory.create_batch(5, user_id=user.id))
+    await session.commit()
+
+    with count_queries() as statements:
+        client.get('/todos/', headers={'Authorization': f'Bearer {token}'})
+
+    assert len(statements) == expected_statements
+
+
+@pytest.mark.asyncio
+async def test_list_todos_does_not_load_entities(session, client, user, token):
+    expected_todos = 5
+    session.add_all(TodoFactory.create_batch(expected_todos, user_id=user.id))
+    await session.commit()
+    session.expunge_all()
+
+    response = client.get(
+        '/todos/', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert len(response.json()['todos']) == expected_todos
+    assert not any(
+        isinstance(entity, Todo) for entity in session.identity_map.values()
+    )
+
+
+@pytest.mark.asyncio
+async def test_list_todos_cursor_pagination_walks_all_pages(
+    session, client, user, token
+):
+    session.add_all(TodoFactory.create_batch(5, user_id=user.id))
+    await session.commit()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    first = client.get('/todos/?limit=3', headers=headers).json()
+    second = client.get(
+        f'/todos/?limit=3&cursor={first["next_cursor"]}', headers=headers
+    ).json()
+
+    ids = [todo['id'] for todo in first['todos'] + second['todos']]
+    assert ids == [1, 2, 3, 4, 5]
+    assert second['next_cursor'] is None
+
+
+def test_list_todos_invalid_cursor(client, token):
+    response = client.get(
+        '/todos/?cursor=not-a-cursor',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json() == {'detail': 'Invalid cursor'}
+
+
+@pytest.mark.asyncio
+async def test_list_todos_search_q_should_return_2(
+    session, client, user, token
+):
+    expected_todos = 2
+    session.add_all(
+        TodoFactory.create_batch(3, user_id=user.id, title='lavar louça')
+    )
+    session.add(TodoFactory(user_id=user.id, title='mercado'))
+    session.add(
+        TodoFactory(user_id=user.id, description='ir ao mercado amanhã')
+    )
+    await session.commit()
+
+    response = client.get(
+        '/todos/?q=mercado', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert len(response.json()['todos']) == expected_todos
+    assert response.json()['next_cursor'] is None
+
+
+def test_list_todos_search_q_rejects_cursor(client, token):
+    response = client.get(
+        '/todos/?q=mercado&cursor=abc',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.asyncio
+async def test_batch_todos(session, client, user, other_user, token):
+    to_update, to_delete = TodoFactory.create_batch(2, user_id=user.id)
+    foreign = TodoFactory(user_id=other_user.id)
+    session.add_all([to_update, to_delete, foreign])
+    await session.commit()
+
+    response = client.post(
+        '/todos/batch',
+        headers={'Authorization': f'Bearer {token}'},
+        json={
+            'create': [
+                {'title': 'a', 'description': 'a'},
+                {'title': 'b', 'description': 'b', 'state': 'todo'},
+            ],
+            'update': [
+                {'id': to_update.id, 'state': 'done'},
+                {'id': foreign.id, 'state': 'done'},
+            ],
+            'delete': [to_delete.id, 42],
+        },
+    )
+    data = response.json()
+
+    assert response.status_code == HTTPStatus.OK
+    assert [(t['title'], t['state']) for t in data['created']] == [
+        ('a', 'draft'),
+        ('b', 'todo'),
+    ]
+    assert [(t['id'], t['state'], t['version']) for t in data['updated']] == [
+        (to_update.id, 'done', 2)
+    ]
+    assert data['deleted'] == [to_delete.id]
+    assert data['not_found'] == [foreign.id, 42]
+
+
+@pytest.mark.asyncio
+async def test_batch_todos_reports_only_written_updates(
+    session, client, user, token
+):
+    user_id = user.id
+    headers = {'Authorization': f'Bearer {token}'}
+    unchanged, removed = client.post(
+        '/todos/batch',
+        headers=headers,
+        json={'create': [{'title': 't', 'description': 'd'}] * 2},
+    ).json()['created']
+    etag = client.get('/todos/', headers=headers).headers['etag']
+
+    noop = client.post(
+        '/todos/batch',
+        headers=headers,
+        json={'update': [{'id': unchanged['id']}]},
+    )
+    cached = client.get('/todos/', headers=headers | {'If-None-Match': etag})
+    response = client.post(
+        '/todos/batch',
+        headers=headers,
+        json={
+            'update': [{'id': removed['id'], 'state': 'done'}],
+            'delete': [removed['id']],
+        },
+    )
+
+    assert noop.json() == {
+        'created': [],
+        'updated': [],
+        'deleted': [],
+        'not_found': [],
+    }
+    assert cached.status_code == HTTPStatus.NOT_MODIFIED
+    assert response.json()['updated'] == []
+    assert response.json()['deleted'] == [removed['id']]
+    assert await counter_drift(session, user_id) == {}
+
+
+@pytest.mark.asyncio
+async def test_batch_todos_statement_count_does_not_grow(
+    session, client, user, token, count_queries
+):
+    # A fixed state keeps the counter deltas of both batches non-zero.
+    todos = TodoFactory.create_batch(40, user_id=user.id, state='todo')
+    session.add_all(todos)
+    await session.commit()
+    headers = {'Authorization': f'Bearer {token}'}
+    client.get('/todos/', headers=headers)
+
+    def batch(size):
+        return {
+            'create': [{'title': 't', 'description': 'd'}] * size,
+            'update': [{'id': t.id, 'title': 'n'} for t in todos[:size]],
+            'delete': [t.id for t in todos[20 : 20 + size]],
+        }
+
+    with count_queries() as small:
+        client.post('/todos/batch', headers=headers, json=batch(2))
+
+    with count_queries() as large:
+        client.post('/todos/batch', headers=headers, json=batch(20))
+
+    assert len(small) == len(large)
+
+
+def test_batch_todos_too_many_operations(client, token, monkeypatch):
+    monkeypatch.setattr(todos.settings, 'TODO_BATCH_MAX_OPERATIONS', 1)
+
+    response = client.post(
+        '/todos/batch',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'delete': [1, 2]},
+    )
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+    assert response.json() == {'detail': 'Batch is limited to 1 operations'}
+
+
+def test_create_todo_statement_count(client, token, count_queries):
+    expected_statements = 4
+
+    with count_queries() as statements:
+        response = client.post(
+            '/todos/',
+            headers={'Authorization': f'Bearer {token}'},
+            json={'title': 't', 'description': 'd'},
+        )
+
+    assert response.json()['created_at']
+    assert len(statements) == expected_statements
+    assert statements[1].startswith('INSERT INTO todo_changes')
+    assert statements[2].startswith('INSERT INTO todos')
+    assert 'RETURNING' in statements[2]
+    assert statements[3].startswith('INSERT INTO todo_counters')
+
+
+@pytest.mark.asyncio
+async def test_patch_todo_statement_count(
+    session, client, user, token, count_queries
+):
+    todo = TodoFactory(user_id=user.id)
+    session.add(todo)
+    await session.commit()
+
+    expected_statements = 3
+
+    with count_queries() as statements:
+        response = client.patch(
+            f'/todos/{todo.id}',
+            headers={'Authorization': f'Bearer {token}'},
+            json={'title': 'Novo'},
+        )
+
+    assert response.json()['title'] == 'Novo'
+    assert response.json()['updated_at']
+    assert len(statements) == expected_statements
+    assert statements[1].startswith('INSERT INTO todo_changes')
+    assert statements[-1].startswith('UPDATE todos')
+    assert 'RETURNING' in statements[-1]
+
+
+@pytest.mark.asyncio
+async def test_patch_todo_state_statement_count(
+    session, client, user, token, count_queries
+):
+    expected_statements = 5
+    todo = TodoFactory(user_id=user.id, state='todo')
+    session.add(todo)
+    await session.commit()
+
+    with count_queries() as statements:
+        response = client.patch(
+            f'/todos/{todo.id}',
+            headers={'Authorization': f'Bearer {token}'},
+            json={'state': 'done'},
+        )
+
+    assert response.json()['state'] == 'done'
+    assert len(statements) == expected_statements
+    assert statements[1].startswith('INSERT INTO todo_changes')
+    assert statements[2].startswith('SELECT todos.state')
+    assert statements[3].startswith('UPDATE todos')
+    assert statements[4].startswith('INSERT INTO todo_counters')
+
+
+@pytest.mark.asyncio
+async def test_patch_todo_state_is_one_statement_on_postgres(
+    pg_session, pg_client
+):
+    expected_statements = 3
+    user = User(
+        username='patch',
+        email='patch@test.com',
+        password=get_password_hash('secret'),
+    )
+    pg_session.add(user)
+    await pg_session.commit()
+    token = pg_client.post(
+        '/auth/token/',
+        data={'username': user.email, 'password': 'secret'},
+    ).json()['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+    todo_id = pg_client.post(
+        '/todos/',
+        headers=headers,
+        json={'title': 't', 'description': 'd', 'state': 'todo'},
+    ).json()['id']
+
+    with watch_engine(pg_session.bind) as log:
+        response = pg_client.patch(
+            f'/todos/{todo_id}', headers=headers, json={'state': 'done'}
+        )
+
+    assert response.json()['state'] == 'done'
+    assert len(log) == expected_statements
+    assert log.statements[0].startswith('INSERT INTO todo_changes')
+    assert log.statements[1].startswith('UPDATE todos')
+    assert 'FOR UPDATE' in log.statements[1]
+    assert 'RETURNING' in log.statements[1]
+    assert log.statements[2].startswith('INSERT INTO todo_counters')
+    assert await counter_drift(pg_session, user.id) == {}
+
+
+@pytest.mark.asyncio
+async def test_delete_todo_statement_count(
+    session, client, user, token, count_queries
+):
+    expected_statements = 5
+    todo = TodoFactory(user_id=user.id)
+    session.add(todo)
+    await session.commit()
+
+    with count_queries() as statements:
+        client.delete(
+            f'/todos/{todo.id}', headers={'Authorization': f'Bearer {token}'}
+        )
+
+    assert len(statements) == expected_statements
+    assert statements[1].startswith('INSERT INTO todo_changes')
+    assert statements[2].startswith('DELETE FROM todos')
+    assert 'RETURNING' in statements[2]
+    assert statements[3].startswith('INSERT INTO todo_tombstones')
+    assert statements[4].startswith('INSERT INTO todo_counters')
+
+
+@pytest.mark.asyncio
+async def test_patch_todo_other_user(session, client, token, other_user):
+    todo_other_user = TodoFactory(user_id=other_user.id)
+    session.add(todo_other_user)
+    await session.commit()
+
+    response = client.patch(
+        f'/todos/{todo_other_user.id}',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'title': 'Novo'},
+    )
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json() == {'detail': 'Todo not found'}
+
+
+@pytest.mark.asyncio
+async def test_patch_todo_without_changes(session, client, user, token):
+    todo = TodoFactory(user_id=user.id)
+    session.add(todo)
+    await session.commit()
+
+    response = client.patch(
+        f'/todos/{todo.id}',
+        headers={'Authorization': f'Bearer {token}'},
+        json={},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['title'] == todo.title
+
+
+@pytest.mark.asyncio
+async def test_patch_todo_with_matching_if_match(session, client, user, token):
+    todo = TodoFactory(user_id=user.id)
+    session.add(todo)
+    await session.commit()
+
+    response = client.patch(
+        f'/todos/{todo.id}',
+        headers={'Authorization': f'Bearer {token}', 'If-Match': '"1"'},
+        json={'title': 'Novo'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['ETag'] == '"2"'
+    assert response.json()['version'] == int(response.headers['ETag'][1:-1])
+
+
+@pytest.mark.asyncio
+async def test_patch_todo_with_stale_if_match(session, client, user, token):
+    todo = TodoFactory(user_id=user.id)
+    session.add(todo)
+    await session.commit()
+    headers = {'Authorization': f'Bearer {token}', 'If-Match': '"1"'}
+    client.patch(f'/todos/{todo.id}', headers=headers, json={'title': 'A'})
+
+    response = client.patch(
+        f'/todos/{todo.id}', headers=headers, json={'title': 'B'}
+    )
+
+    assert response.status_code == HTTPStatus.PRECONDITION_FAILED
+    assert response.json() == {
+        'detail': 'Todo was modified by another request'
+    }
+
+
+@pytest.mark.asyncio
+async def test_delete_todo_with_stale_if_match(session, client, user, token):
+    todo = TodoFactory(user_id=user.id)
+    session.add(todo)
+    await session.commit()
+    client.patch(
+        f'/todos/{todo.id}',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'title': 'A'},
+    )
+
+    response = client.delete(
+        f'/todos/{todo.id}',
+        headers={'Authorization': f'Bearer {token}', 'If-Match': '"1"'},
+    )
+
+    assert response.status_code == HTTPStatus.PRECONDITION_FAILED
+
+
+def test_patch_todo_with_if_match_not_found(client, token):
+    response = client.patch(
+        '/todos/42',
+        headers={'Authorization': f'Bearer {token}', 'If-Match': '"1"'},
+        json={'title': 'A'},
+    )
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json() == {'detail': 'Todo not found'}
+
+
+@pytest.mark.asyncio
+async def test_sync_todos_returns_only_changes(
+    session, client, user, token, other_user
+):
+    expected_todos = 3
+    headers = {'Authorization': f'Bearer {token}'}
+    session.add_all(TodoFactory.create_batch(expected_todos, user_id=user.id))
+    session.add(TodoFactory(user_id=other_user.id))
+    await session.commit()
+
+    response = client.get('/todos/sync', headers=headers)
+    first = response.json()
+
+    assert response.status_code == HTTPStatus.OK
+    assert len(first['todos']) == expected_todos
+    assert first['deleted'] == []
+    assert first['has_more'] is False
+
+    unchanged = client.get(
+        '/todos/sync', headers=headers, params={'token': first['token']}
+    ).json()
+    assert unchanged['todos'] == []
+    assert unchanged['deleted'] == []
+    assert unchanged['token'] == first['token']
+
+    patched_id, deleted_id = first['todos'][0]['id'], first['todos'][1]['id']
+    client.patch(f'/todos/{patched_id}', headers=headers, json={'title': 'x'})
+    client.delete(f'/todos/{deleted_id}', headers=headers)
+    created = client.post(
+        '/todos/',
+        headers=headers,
+        json={'title': 'new', 'description': 'new', 'state': 'todo'},
+    ).json()
+
+    changes = client.get(
+        '/todos/sync', headers=headers, params={'token': first['token']}
+    ).json()
+
+    assert [todo['id'] for todo in changes['todos']] == [
+        patched_id,
+        created['id'],
+    ]
+    assert changes['deleted'] == [deleted_id]
+
+
+@pytest.mark.asyncio
+async def test_sync_todos_pages_with_limit(session, client, user, token):
+    expected_todos = 5
+    headers = {'Authorization': f'Bearer {token}'}
+    session.add_all(TodoFactory.create_batch(expected_todos, user_id=user.id))
+    await session.commit()
+
+    seen = []
+    params = {'limit': 2}
+    while True:
+        response = client.get('/todos/sync', headers=headers, params=params)
+        seen += [todo['id'] for todo in response.json()['todos']]
+        params['token'] = response.json()['token']
+        if not response.json()['has_more']:
+            break
+
+    assert sorted(seen) == sorted(set(seen))
+    assert len(seen) == expected_todos
+
+
+@pytest.mark.asyncio
+async def test_sync_todos_batch_delete_leaves_tombstones(
+    session, client, user, token
+):
+    headers = {'Authorization': f'Bearer {token}'}
+    session.add_all(TodoFactory.create_batch(2, user_id=user.id))
+    await session.commit()
+    sync_token = client.get('/todos/sync', headers=headers).json()['token']
+
+    todo_ids = [todo.id for todo in await session.scalars(select(Todo))]
+    client.post('/todos/batch', headers=headers, json={'delete': todo_ids})
+
+    response = client.get(
+        '/todos/sync', headers=headers, params={'token': sync_token}
+    )
+
+    assert sorted(response.json()['deleted']) == sorted(todo_ids)
+
+
+@pytest.mark.asyncio
+async def test_sync_token_does_not_pass_a_change_in_flight(pg_session):
+    user = User(username='sync', email='sync@test.com', password='x')
+    pg_session.add(user)
+    await pg_session.commit()
+    principal = Principal(id=user.id, email=user.email, username=user.username)
+
+    async def write(session, title):
+        session.add(
+            Todo(
+                title=title,
+                description=title,
+                state=TodoState.todo,
+                user_id=user.id,
+                change_seq=await next_change(session, user.id),
+            )
+        )
+        await session.flush()
+
+    async with (
+        AsyncSession(pg_session.bind) as slow,
+        AsyncSession(pg_session.bind) as fast,
+    ):
+        await write(slow, 'slow')
+        synced = await todos.sync_todos(pg_session, principal, FilterSync())
+        # The second writer queues behind the first one's change counter,
+        # so it cannot commit a later seq while the first is in flight.
+        fast_write = asyncio.create_task(write(fast, 'fast'))
+        await asyncio.sleep(0.2)
+        blocked = not fast_write.done()
+        await slow.commit()
+        await fast_write
+        await fast.commit()
+
+    changes = await todos.sync_todos(
+        pg_session, principal, FilterSync(token=synced['token'])
+    )
+
+    assert synced['todos'] == []
+    assert blocked
+    assert [todo.title for todo in changes['todos']] == ['slow', 'fast']
+
+
+def test_sync_todos_invalid_token(client, token):
+    response = client.get(
+        '/todos/sync',
+        headers={'Authorization': f'Bearer {token}'},
+        params={'token': 'not-a-token'},
+    )
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json() == {'detail': 'Invalid sync token'}
+
+
+@pytest.mark.asyncio
+async def test_export_todos_ndjson(session, client, user, token, other_user):
+    session.add_all(TodoFactory.create_batch(3, user_id=user.id))
+    session.add(TodoFactory(user_id=other_user.id))
+    await session.commit()
+
+    response = client.get(
+        '/todos/export', headers={'Authorization': f'Bearer {token}'}
+    )
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    todos = client.get(
+        '/todos/', headers={'Authorization': f'Bearer {token}'}
+    ).json()['todos']
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    assert rows == todos
+
+
+@pytest.mark.asyncio
+async def test_export_todos_csv(session, client, user, token):
+    todo = TodoFactory(user_id=user.id, state='done')
+    session.add(todo)
+    await session.commit()
+
+    response = client.get(
+        '/todos/export',
+        headers={'Authorization': f'Bearer {token}'},
+        params={'format': 'csv'},
+    )
+    header, row = list(csv.reader(io.StringIO(response.text)))
+
+    assert response.headers['content-type'].startswith('text/csv')
+    assert 'todos.csv' in response.headers['content-disposition']
+    assert header == [
+        'id',
+        'title',
+        'description',
+        'state',
+        'version',
+        'created_at',
+        'updated_at',
+    ]
+    assert row[:5] == [str(todo.id), todo.title, todo.description, 'done', '1']
+
+
+@pytest.mark.asyncio
+async def test_export_todos_streams_in_chunks(session, user):
+    chunk_size = 2
+    session.add_all(TodoFactory.create_batch(5, user_id=user.id))
+    await session.commit()
+
+    chunks = [
+        chunk
+        async for chunk in export_todos(
+            session.bind, user.id, 'ndjson', chunk_size
+        )
+    ]
+
+    assert [chunk.count('\n') for chunk in chunks] == [2, 2, 1]
+
+
+def test_import_todos_ndjson_reports_row_errors(client, token):
+    expected_imported = 2
+    body = '\n'.join([
+        json.dumps({'title': 'a', 'description': 'a', 'state': 'todo'}),
+        '',
+        '{not json',
+        json.dumps({'title': 'b', 'description': 'b', 'state': 'nope'}),
+        json.dumps({'title': 'c', 'description': 'c'}),
+    ])
+
+    response = client.post(
+        '/todos/import',
+        headers={'Authorization': f'Bearer {token}'},
+        content=body.encode(),
+    )
+    todos = client.get(
+        '/todos/', headers={'Authorization': f'Bearer {token}'}
+    ).json()['todos']
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['imported'] == expected_imported
+    assert len(todos) == expected_imported
+    assert [error['line'] for error in response.json()['errors']] == [3, 4]
+    assert response.json()['failed'] == len(response.json()['errors'])
+    assert response.json()['errors'][1]['detail'].startswith('state:')
+
+
+@pytest.mark.asyncio
+async def test_import_todos_csv_round_trips_export(
+    session, client, user, token, other_user
+):
+    session.add(
+        TodoFactory(user_id=user.id, description='multi\nline, "quoted"')
+    )
+    session.add(TodoFactory(user_id=user.id))
+    await session.commit()
+    exported = client.get(
+        '/todos/export',
+        headers={'Authorization': f'Bearer {token}'},
+        params={'format': 'csv'},
+    )
+    other_token = client.post(
+        '/auth/token',
+        data={
+            'username': other_user.email,
+            'password': other_user.clean_password,
+        },
+    ).json()['access_token']
+
+    response = client.post(
+        '/todos/import',
+        headers={'Authorization': f'Bearer {other_token}'},
+        params={'format': 'csv'},
+        content=exported.content,
+    )
+    imported = client.get(
+        '/todos/export', headers={'Authorization': f'Bearer {other_token}'}
+    )
+    original = client.get(
+        '/todos/export', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert response.json() == {'imported': 2, 'failed': 0, 'errors': []}
+    assert [
+        (row['title'], row['description'], row['state'])
+        for row in map(json.loads, imported.text.splitlines())
+    ] == [
+        (row['title'], row['description'], row['state'])
+        for row in map(json.loads, original.text.splitlines())
+    ]
+
+
+def test_import_todos_commits_in_chunks(
+    client, token, monkeypatch, count_queries
+):
+    chunk_size = 2
+    monkeypatch.setattr(todos.settings, 'TODO_IMPORT_CHUNK_SIZE', chunk_size)
+    body = ''.join(
+        json.dumps({'title': f't{n}', 'description': 'd'}) + '\n'
+        for n in range(5)
+    )
+
+    with count_queries() as statements:
+        response = client.post(
+            '/todos/import',
+            headers={'Authorization': f'Bearer {token}'},
+            content=body.encode(),
+        )
+
+    inserts = [s for s in statements if s.startswith('INSERT INTO todos')]
+    assert response.json()['imported'] == len(body.splitlines())
+    assert len(inserts) == math.ceil(len(body.splitlines()) / chunk_size)
+
+
+def test_import_todos_caps_reported_errors(client, token, monkeypatch):
+    max_errors, invalid_rows = 2, 5
+    monkeypatch.setattr(todos.settings, 'TODO_IMPORT_MAX_ERRORS', max_errors)
+
+    response = client.post(
+        '/todos/import',
+        headers={'Authorization': f'Bearer {token}'},
+        content=b'[]\n' * invalid_rows,
+    )
+
+    assert response.json()['failed'] == invalid_rows
+    assert len(response.json()['errors']) == max_errors
+
+
+@pytest.mark.asyncio
+async def test_import_todos_uses_copy_on_postgres(pg_session):
+    user = User(username='copy', email='copy@test.com', password='x')
+    pg_session.add(user)
+    await pg_session.commit()
+
+    async def body():
+        yield b'{"title": "a", "description": "tab\\there"}\n{"tit'
+        yield b'le": "b", "description": "b", "state": "done"}\n'
+
+    result = await import_todos(
+        pg_session, user.id, read_todos(body(), 'ndjson'), 1, 10
+    )
+    todos = await pg_session.scalars(select(Todo).order_by(Todo.id))
+
+    assert result == {'imported': 2, 'failed': 0, 'errors': []}
+    assert [(todo.title, todo.description) for todo in todos] == [
+        ('a', 'tab\there'),
+        ('b', 'b'),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_list_todos_sparse_fields(
+    session, client, user, token, count_queries
+):
+    session.add_all(TodoFactory.create_batch(2, user_id=user.id))
+    await session.commit()
+
+    with count_queries() as statements:
+        response = client.get(
+            '/todos/',
+            headers={'Authorization': f'Bearer {token}'},
+            params={'fields': 'title, state'},
+        )
+
+    assert response.status_code == HTTPStatus.OK
+    assert all(
+        set(todo) == {'id', 'title', 'state'}
+        for todo in response.json()['todos']
+    )
+    assert statements[-1].startswith(
+        'SELECT todos.title, todos.state, todos.id \nFROM todos'
+    )
+
+
+def test_list_todos_unknown_fields(client, token):
+    response = client.get(
+        '/todos/',
+        headers={'Authorization': f'Bearer {token}'},
+        params={'fields': 'title,user_id,secret'},
+    )
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+    assert response.json() == {'detail': 'Unknown fields: secret, user_id'}
+
+
+@pytest.mark.parametrize('params', [{}, {'include_total': 'exact'}])
+def test_list_todos_not_modified(client, token, count_queries, params):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post(
+        '/todos/batch',
+        headers=headers,
+        json={'create': [{'title': 't', 'description': 'd'}] * 3},
+    )
+    etag = client.get('/todos/', headers=headers, params=params).headers[
+        'etag'
+    ]
+
+    with count_queries() as statements:
+        response = client.get(
+            '/todos/',
+            headers=headers | {'If-None-Match': etag},
+            params=params,
+        )
+
+    assert etag.startswith('W/"')
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert response.headers['etag'] == etag
+    assert not response.content
+    assert len(statements) == 1
+    assert 'FROM todo_changes' in statements[0]
+    assert 'todos' not in statements[0].replace('todo_changes', '')
+
+
+@pytest.mark.asyncio
+async def test_list_todos_etag_changes_with_data_and_params(
+    session, client, user, token
+):
+    headers = {'Authorization': f'Bearer {token}'}
+    session.add_all(TodoFactory.create_batch(3, user_id=user.id))
+    await session.commit()
+    etag = client.get('/todos/', headers=headers).headers['etag']
+    todo_id = client.get('/todos/', headers=headers).json()['todos'][0]['id']
+
+    paged = client.get(
+        '/todos/',
+        headers=headers | {'If-None-Match': etag},
+        params={'limit': 1},
+    )
+    client.delete(f'/todos/{todo_id}', headers=headers)
+    changed = client.get('/todos/', headers=headers | {'If-None-Match': etag})
+
+    assert paged.status_code == HTTPStatus.OK
+    assert changed.status_code == HTTPStatus.OK
+    assert changed.headers['etag'] != etag
+
+
+def test_list_todos_sparse_fields_keep_etag(client, token):
+    response = client.get(
+        '/todos/',
+        headers={'Authorization': f'Bearer {token}'},
+        params={'fields': 'title'},
+    )
+
+    assert response.headers['etag'].startswith('W/"')
+
+
+@pytest.mark.asyncio
+async def test_list_todos_exact_total_counted_once(
+    session, client, user, token, count_queries
+):
+    expected_total = 5
+    expected_statements = 2
+    headers = {'Authorization': f'Bearer {token}'}
+    session.add_all(TodoFactory.create_batch(expected_total, user_id=user.id))
+    await session.commit()
+    cursor = client.get(
+        '/todos/', headers=headers, params={'limit': 2}
+    ).json()['next_cursor']
+
+    with count_queries() as statements:
+        response = client.get(
+            '/todos/',
+            headers=headers,
+            params={'limit': 2, 'cursor': cursor, 'include_total': 'exact'},
+        )
+
+    assert response.json()['size'] == len(response.json()['todos'])
+    assert response.json()['total'] == expected_total
+    assert 'total_count' not in response.json()['todos'][0]
+    assert len(statements) == expected_statements
+    assert 'FROM todo_changes' in statements[-2]
+    assert 'count(*)' not in statements[-2]
+    assert statements[-1].count('count(*)') == 1
+    assert 'LIMIT' in statements[-1]
+
+
+@pytest.mark.asyncio
+async def test_list_todos_total_past_the_last_page(
+    session, client, user, token
+):
+    expected_total = 2
+    session.add_all(TodoFactory.create_batch(expected_total, user_id=user.id))
+    await session.commit()
+
+    response = client.get(
+        '/todos/',
+        headers={'Authorization': f'Bearer {token}'},
+        params={'offset': 10, 'include_total': 'exact'},
+    )
+
+    assert response.json()['size'] == 0
+    assert response.json()['total'] == expected_total
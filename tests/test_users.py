@@ -1,6 +1,12 @@
 from http import HTTPStatus
 
+import pytest
+from sqlalchemy import func, select
+
+from fast_zero.models import Todo, User
+from fast_zero.routers.users import purge_user_data
 from fast_zero.schemas import UserPublic
+from tests.conftest import TodoFactory
 
 
 def test_create_user_deve_retornar_usuario_criado(client):
@@ -36,6 +42,8 @@ def test_read_users(client, user, token):
             user_schema,
         ],
         'size': 1,
+        'next_cursor': None,
+        'total': None,
     }
 
 
@@ -143,3 +151,276 @@ def test_delete_other_user(client, user, other_user, token):
 
     assert response.status_code == HTTPStatus.FORBIDDEN
     assert response.json() == {'detail': 'Not enough permissions'}
+
+
+def test_user_endpoints_statement_count(client, user, token, count_queries):
+    headers = {'Authorization': f'Bearer {token}'}
+
+    with count_queries() as statements:
+        client.get(f'/users/{user.id}')
+    assert len(statements) == 1
+
+    expected_statements = 2
+    with count_queries() as statements:
+        client.get('/users/', headers=headers)
+    assert len(statements) == expected_statements
+
+
+def test_read_users_cursor_pagination(client, user, other_user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+
+    first = client.get('/users/?limit=1', headers=headers).json()
+    second = client.get(
+        f'/users/?limit=1&cursor={first["next_cursor"]}', headers=headers
+    ).json()
+
+    assert [u['id'] for u in first['users']] == [user.id]
+    assert [u['id'] for u in second['users']] == [other_user.id]
+
+
+def test_read_users_selects_public_columns_only(client, token, count_queries):
+    with count_queries() as statements:
+        client.get('/users/', headers={'Authorization': f'Bearer {token}'})
+
+    assert statements[-1].startswith('SELECT users.username, users.email')
+    assert 'password' not in statements[-1]
+
+
+def test_create_user_statement_count(client, count_queries):
+    with count_queries() as statements:
+        client.post(
+            '/users/',
+            json={
+                'username': 'alice',
+                'email': 'alice@example.com',
+                'password': 'secret',
+            },
+        )
+
+    assert len(statements) == 1
+    assert statements[-1].startswith('INSERT INTO users')
+    assert 'RETURNING' in statements[-1]
+
+
+def test_create_user_conflict_after_failed_insert_keeps_session_usable(
+    client, user
+):
+    user_id, email = user.id, user.email
+    client.post(
+        '/users/',
+        json={'username': 'other', 'email': email, 'password': 'secret'},
+    )
+
+    response = client.get(f'/users/{user_id}')
+
+    assert response.status_code == HTTPStatus.OK
+
+
+@pytest.mark.asyncio
+async def test_create_user_ignores_stale_principal_cache(
+    session, client, user, token
+):
+    client.get('/users/', headers={'Authorization': f'Bearer {token}'})
+    # Another worker deletes the user; this worker's cache still holds it.
+    await session.delete(user)
+    await session.commit()
+
+    response = client.post(
+        '/users/',
+        json={
+            'username': 'other',
+            'email': user.email,
+            'password': 'secret',
+        },
+    )
+
+    assert response.status_code == HTTPStatus.CREATED
+
+
+def test_update_user_statement_count(client, user, token, count_queries):
+    expected_statements = 3
+
+    with count_queries() as statements:
+        client.put(
+            f'/users/{user.id}',
+            headers={'Authorization': f'Bearer {token}'},
+            json={
+                'username': 'alice',
+                'email': 'alice@example.com',
+                'password': 'secret',
+            },
+        )
+
+    assert len(statements) == expected_statements
+    assert statements[-1].startswith('UPDATE users')
+    assert 'RETURNING' in statements[-1]
+
+
+@pytest.mark.asyncio
+async def test_delete_user_cascades_todos_in_one_statement(
+    session, client, user, token, count_queries
+):
+    user_id = user.id
+    expected_statements = 2
+    session.add_all(TodoFactory.create_batch(30, user_id=user_id))
+    await session.commit()
+
+    with count_queries() as statements:
+        response = client.delete(
+            f'/users/{user_id}', headers={'Authorization': f'Bearer {token}'}
+        )
+
+    remaining = await session.scalar(
+        select(func.count()).select_from(Todo).where(Todo.user_id == user_id)
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert len(statements) == expected_statements
+    assert remaining == 0
+
+
+@pytest.mark.asyncio
+async def test_purge_user(session, client, user, token):
+    user_id = user.id
+    session.add_all(TodoFactory.create_batch(10, user_id=user_id))
+    await session.commit()
+
+    response = client.post(
+        f'/users/{user_id}/purge',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    remaining_users = await session.scalar(
+        select(func.count()).select_from(User).where(User.id == user_id)
+    )
+    assert response.status_code == HTTPStatus.ACCEPTED
+    assert response.json() == {'message': 'User deletion scheduled'}
+    assert remaining_users == 0
+
+
+@pytest.mark.asyncio
+async def test_purge_user_data_deletes_todos_in_batches(
+    session, user, count_queries
+):
+    expected_batches = 3
+    user_id = user.id
+    session.add_all(TodoFactory.create_batch(10, user_id=user_id))
+    await session.commit()
+
+    with count_queries() as statements:
+        await purge_user_data(session.bind, user_id, batch_size=4)
+
+    todo_deletes = [s for s in statements if s.startswith('DELETE FROM todos')]
+    remaining_todos = await session.scalar(
+        select(func.count()).select_from(Todo).where(Todo.user_id == user_id)
+    )
+    assert len(todo_deletes) == expected_batches
+    assert remaining_todos == 0
+
+
+def test_purge_other_user(client, user, other_user, token):
+    response = client.post(
+        f'/users/{other_user.id}/purge',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.FORBIDDEN
+    assert response.json() == {'detail': 'Not enough permissions'}
+
+
+def test_read_user_sparse_fields(client, user):
+    response = client.get(f'/users/{user.id}', params={'fields': 'username'})
+
+    assert response.json() == {'username': user.username, 'id': user.id}
+
+
+def test_read_users_sparse_fields(client, user, token):
+    response = client.get(
+        '/users/',
+        headers={'Authorization': f'Bearer {token}'},
+        params={'fields': 'email'},
+    )
+
+    assert response.json()['users'] == [{'email': user.email, 'id': user.id}]
+
+
+def test_read_user_unknown_fields(client, user):
+    response = client.get(f'/users/{user.id}', params={'fields': 'password'})
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+    assert response.json() == {'detail': 'Unknown fields: password'}
+
+
+def test_sparse_fields_are_documented(client):
+    paths = client.get('/openapi.json').json()['paths']
+    parameters = paths['/users/{user_id}']['get']['parameters']
+
+    fields = next(param for param in parameters if param['name'] == 'fields')
+    assert 'Comma-separated' in fields['description']
+
+
+def test_read_user_conditional_get(client, user):
+    response = client.get(f'/users/{user.id}')
+    etag, last_modified = (
+        response.headers['etag'],
+        response.headers['last-modified'],
+    )
+
+    by_etag = client.get(f'/users/{user.id}', headers={'If-None-Match': etag})
+    by_date = client.get(
+        f'/users/{user.id}', headers={'If-Modified-Since': last_modified}
+    )
+    other_fields = client.get(
+        f'/users/{user.id}',
+        headers={'If-None-Match': etag},
+        params={'fields': 'email'},
+    )
+
+    assert by_etag.status_code == HTTPStatus.NOT_MODIFIED
+    assert by_date.status_code == HTTPStatus.NOT_MODIFIED
+    assert other_fields.status_code == HTTPStatus.OK
+    assert other_fields.headers['etag'] != etag
+
+
+def test_read_user_modified_after_update(client, user, token):
+    etag = client.get(f'/users/{user.id}').headers['etag']
+
+    client.put(
+        f'/users/{user.id}',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'username': 'changed', 'email': user.email, 'password': 'x'},
+    )
+
+    response = client.get(f'/users/{user.id}', headers={'If-None-Match': etag})
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['username'] == 'changed'
+
+
+def test_read_users_exact_total(client, other_user, token, count_queries):
+    expected_total = 2
+
+    with count_queries() as statements:
+        response = client.get(
+            '/users/',
+            headers={'Authorization': f'Bearer {token}'},
+            params={'limit': 1, 'include_total': 'exact'},
+        )
+
+    assert response.json()['size'] == 1
+    assert response.json()['total'] == expected_total
+    assert 'count(*)' in statements[-1]
+    assert 'LIMIT' in statements[-1]
+
+
+def test_read_users_estimated_total_falls_back_to_exact(
+    client, other_user, token
+):
+    expected_total = 2
+
+    response = client.get(
+        '/users/',
+        headers={'Authorization': f'Bearer {token}'},
+        params={'include_total': 'estimated'},
+    )
+
+    assert response.json()['total'] == expected_total